@@ -0,0 +1,50 @@
+from contextvars import ContextVar
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+from starlette.datastructures import MutableHeaders
+
+# 当前请求的标记列表；列表对象在请求内共享，子任务 (gather / SingleFlight) 中的标记对外层同样可见
+_stale_marks: ContextVar[Optional[List[bool]]] = ContextVar("stale_marks", default=None)
+
+def mark_stale():
+    """记录本次请求返回了过期的缓存数据 (后台刷新中或上游不可用)"""
+    marks = _stale_marks.get()
+    if marks is not None:
+        marks.append(True)
+
+T = TypeVar("T")
+
+async def track_stale(fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+    """
+    执行 fn，返回 (结果, 期间是否返回过过期数据)。
+    期间的标记记在独立的列表中，不直接标记外层请求，由调用方决定是否 mark_stale()
+    """
+    marks: List[bool] = []
+    token = _stale_marks.set(marks)
+    try:
+        result = await fn()
+    finally:
+        _stale_marks.reset(token)
+    return result, bool(marks)
+
+class CacheStatusMiddleware:
+    """请求期间若返回了过期缓存，在响应中加上 X-Cache-Status: stale"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        marks: List[bool] = []
+        token = _stale_marks.set(marks)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start" and marks:
+                MutableHeaders(scope=message)["X-Cache-Status"] = "stale"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _stale_marks.reset(token)
@@ -1,21 +1,40 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from typing import Optional
 
 class Settings(BaseSettings):
     TMDB_API_KEY: str
     TMDB_LANGUAGE: str = "zh-CN"
+    TMDB_MAX_CONCURRENCY: int = 5  # 同时发往 TMDB 的最大请求数
+    TMDB_WARM_PAGES: int = 5       # 定时预热热门电影/剧集详情的页数 (每页 20 部)，0 为关闭
     NULLBR_APP_ID: str = ""
     NULLBR_API_KEY: str = ""
+    NULLBR_MAX_CONCURRENCY: int = 5  # 同时发往 Nullbr 的最大请求数
+    NULLBR_RATE_LIMIT: float = 5     # 每秒发往 Nullbr 的最大请求数
+    NULLBR_CACHE_TTL: int = 600      # Nullbr 资源列表的进程内缓存时间 (秒)
+    RESOURCE_CACHE_TTL_HOURS: int = 12  # Nullbr 资源列表的持久化 (SQLite) 缓存时间 (小时)
     PROXY_URL: Optional[str] = None
     P115_COOKIE: str = ""
     P115_SAVE_PATH: str = ""
     P115_DOWNLOAD_PATH: str = ""
+    P115_MAX_CONCURRENCY: int = 4  # 同时进行的 115 请求数 (共享同一个 P115Client 连接池)
     MOVIEPILOT_URL: Optional[str] = None
     MOVIEPILOT_APIKEY: Optional[str] = None
+    SUB_CONCURRENCY: int = 4  # 调度时同时检查的订阅数
+    SERVE_STATIC: bool = True  # 前置 nginx 等反向代理直接托管 /static 时设为 False
+    LOG_LEVEL: str = "INFO"
 
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
         extra = "ignore"
 
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    进程内只解析一次 .env / 环境变量。
+    路由中可通过 Depends(get_settings) 注入，测试时可用 app.dependency_overrides 覆盖。
+    """
+    return Settings()
+
+settings = get_settings()
\ No newline at end of file
@@ -0,0 +1,22 @@
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+def setup_logging(level: str = "INFO") -> QueueListener:
+    """
+    为 app.* 日志配置 QueueHandler：业务代码只负责入队，
+    实际的格式化与输出由 QueueListener 的后台线程完成，不阻塞事件循环。
+    返回 listener，关闭时需调用 stop() 以刷新剩余日志。
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+
+    logger = logging.getLogger("app")
+    logger.setLevel(level.upper())
+    logger.handlers[:] = [QueueHandler(log_queue)]
+    logger.propagate = False
+
+    listener.start()
+    return listener
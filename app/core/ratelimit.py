@@ -0,0 +1,23 @@
+import asyncio
+
+class RateLimiter:
+    """
+    简单的异步限速器：每次 acquire 预约一个时间槽，相邻请求至少间隔 period / rate 秒。
+    用法: async with limiter: ...
+    """
+    def __init__(self, rate: float, period: float = 1.0):
+        self._interval = period / rate
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc):
+        return False
@@ -0,0 +1,35 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, List, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    合并并发的相同请求 (类似 Go 的 singleflight)：
+    同一 key 在执行期间，后来的调用者直接等待第一个请求的结果，而不是重复请求上游。
+    """
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        # shield: 某个调用者被取消时不影响其他等待者共享的任务
+        return await asyncio.shield(task)
+
+    def cancel_all(self) -> List[asyncio.Task]:
+        """取消所有执行中的任务 (关闭时使用)，返回这些任务供调用方等待结束"""
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        return tasks
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 取出异常，避免所有调用者都已取消时出现 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
@@ -1,37 +1,138 @@
+import contextlib
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from pathlib import Path
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
+from starlette.datastructures import QueryParams
 from app.routers import meta, resources, p115, subscription
 from app.services.subscription import subscription_service
+from app.services.strm import strm_service
+from app.services.tmdb import tmdb_service
+from app.core.config import settings
+from app.core.log import setup_logging
+from app.core.cache_status import CacheStatusMiddleware
 import asyncio
+import logging
+import hashlib
+import os
+import re
+
+logger = logging.getLogger(__name__)
 
 background_tasks = set()
 
+STATIC_DIR = Path("static")
+_ASSET_REF_RE = re.compile(r'(["\'])/static/([^"\'?#]+)\1')
+
+# 可长期缓存的静态资源类型
+LONG_CACHE_SUFFIXES = (".js", ".css", ".png", ".jpg", ".jpeg", ".svg", ".ico", ".woff2")
+
+class CachedStaticFiles(StaticFiles):
+    """
+    为静态资源附加 Cache-Control 头。
+    静态文件名不带哈希，因此只有带版本参数 (?v=...) 的请求才允许 immutable 长缓存，
+    其余请求使用 no-cache，由浏览器凭 ETag/Last-Modified 协商 (304)。
+    """
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        versioned = "v" in QueryParams(scope.get("query_string", b""))
+        if versioned and str(full_path).endswith(LONG_CACHE_SUFFIXES):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
+def _load_index():
+    """
+    读取 index.html 到内存，并为其中引用的本地资源追加内容哈希 (?v=...)，
+    使静态资源可以安全地长期缓存。返回 (html_bytes, etag)。
+    """
+    html = (STATIC_DIR / "index.html").read_text(encoding="utf-8")
+
+    def _fingerprint(match):
+        quote, name = match.group(1), match.group(2)
+        asset = STATIC_DIR / name
+        if not asset.is_file():
+            return match.group(0)
+        digest = hashlib.md5(asset.read_bytes()).hexdigest()[:12]
+        return f"{quote}/static/{name}?v={digest}{quote}"
+
+    content = _ASSET_REF_RE.sub(_fingerprint, html).encode("utf-8")
+    return content, f'"{hashlib.md5(content).hexdigest()}"'
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Triggering lifespan startup event...") # 添加日志验证是否触发
-    task = asyncio.create_task(subscription_service.start_scheduler())
-    background_tasks.add(task)
-    task.add_done_callback(background_tasks.discard)
+    log_listener = setup_logging(settings.LOG_LEVEL)
+    logger.info("Triggering lifespan startup event...")
+    app.state.index_html, app.state.index_etag = _load_index()
+
+    tasks = [
+        asyncio.create_task(subscription_service.start_scheduler(), name="subscription-scheduler"),
+        asyncio.create_task(tmdb_service.start_warmer(), name="tmdb-warmer"),
+    ]
+    for task in tasks:
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
 
     yield
 
-    task.cancel()
+    # 取消后等待任务真正结束，避免 "Task was destroyed but it is pending!" 并让关闭流程可预期
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await strm_service.aclose()
+    await tmdb_service.aclose()
+    log_listener.stop()
 
 app = FastAPI(title="Fullbr115", lifespan=lifespan)
 
+# 资源列表/详情等 JSON 响应体积较大，统一压缩以减少传输量
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=5)
+# TMDB 不可用等情况下返回了过期缓存时，通过 X-Cache-Status: stale 告知前端
+app.add_middleware(CacheStatusMiddleware)
+
 app.include_router(meta.router)
 app.include_router(resources.router)
 app.include_router(p115.router)
 app.include_router(subscription.router)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# 生产环境可由反向代理 (nginx 等) 直接托管 /static，见 nginx.conf.example
+if settings.SERVE_STATIC:
+    app.mount("/static", CachedStaticFiles(directory=STATIC_DIR), name="static")
 
 @app.get("/")
-async def read_index():
-    return FileResponse('static/index.html')
+async def read_index(request: Request):
+    headers = {"ETag": request.app.state.index_etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == request.app.state.index_etag:
+        return Response(status_code=304, headers=headers)
+    return Response(request.app.state.index_html, media_type="text/html", headers=headers)
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+
+    if "--reload" in sys.argv:
+        # 开发模式：由 watchfiles 监听 app 目录变更并热重载 (仅单进程)
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            reload_dirs=["app"],
+            reload_includes=["*.py"]
+        )
+    else:
+        # 生产模式：订阅调度器与订阅数据都在进程内，多 worker 会重复调度，
+        # 因此默认单 worker，确有需要时通过 WEB_CONCURRENCY 调整
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8000,
+            loop="uvloop",
+            http="httptools",
+            workers=int(os.getenv("WEB_CONCURRENCY", "1"))
+        )
\ No newline at end of file
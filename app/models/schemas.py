@@ -1,12 +1,20 @@
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 from typing import Optional, List, Dict, Any
 
+class ServiceModel(BaseModel):
+    """
+    由服务层构造并维护的数据模型：TMDB / Nullbr 返回的数据，以及服务内部持续更新的订阅记录。
+    忽略多余字段；赋值时不做校验 (如 details.availability = ...、调度器改写订阅状态)。
+    客户端输入仍在构造时完整校验，服务层信任的上游数据则用 model_construct 跳过校验。
+    """
+    model_config = ConfigDict(extra='ignore', validate_assignment=False, str_strip_whitespace=False)
+
 # --- 基础组件 ---
-class Genre(BaseModel):
+class Genre(ServiceModel):
     id: int
     name: str
 
-class Person(BaseModel):
+class Person(ServiceModel):
     id: int
     name: str
     character: Optional[str] = None # 饰演角色 (演员用)
@@ -14,14 +22,14 @@ class Person(BaseModel):
     profile_path: Optional[str] = None
 
 # --- 资源可用性 (New) ---
-class ResourceAvailability(BaseModel):
+class ResourceAvailability(ServiceModel):
     has_115: bool = False
     has_magnet: bool = False
     has_ed2k: bool = False
     has_video: bool = False
 
 # --- 基础媒体信息 (列表页用) ---
-class MediaMeta(BaseModel):
+class MediaMeta(ServiceModel):
     tmdb_id: int
     title: str
     original_title: str
@@ -34,7 +42,7 @@ class MediaMeta(BaseModel):
     genre_ids: List[int] = [] # 列表页通常只有ID
 
 # --- 剧集特有结构 ---
-class Episode(BaseModel):
+class Episode(ServiceModel):
     id: int
     episode_number: int
     season_number: int
@@ -45,7 +53,7 @@ class Episode(BaseModel):
     vote_average: float = 0.0
     availability: Optional[ResourceAvailability] = None
 
-class Season(BaseModel):
+class Season(ServiceModel):
     id: int
     season_number: int
     name: str
@@ -71,16 +79,17 @@ class MediaDetail(MediaMeta):
     # 资源可用性
     availability: Optional[ResourceAvailability] = None
 
-class SearchResult(BaseModel):
+class SearchResult(ServiceModel):
     total_results: int
     page: int
     results: List[MediaMeta]
 
 # --- NULLBR 资源 ---
-class MediaResource(BaseModel):
+class MediaResource(ServiceModel):
     """
     统一资源模型
     适配 Nullbr SDK 的三种资源类型: 115, Magnet, Ed2k
+    字段归一化 (列表转字符串、int 转 bool) 在 NullbrService 中完成
     """
     title: str              # 资源名称 (name or title)
     size: str               # 文件大小
@@ -96,19 +105,8 @@ class MediaResource(BaseModel):
     # --- 115特有 ---
     season_list: Optional[List[str]] = None # 仅 115 分享链接可能有此字段
 
-    @field_validator('quality', 'source', mode='before')
-    def parse_list_fields(cls, v):
-        """处理 quality, source 字段可能是列表的情况"""
-        if isinstance(v, list):
-            return ", ".join([str(i) for i in v])
-        return v
-
-    @field_validator('has_chinese_subtitle', mode='before')
-    def parse_zh_sub(cls, v):
-        """处理 int 类型的 bool"""
-        if isinstance(v, int):
-            return bool(v)
-        return v
+class CacheInvalidateResponse(BaseModel):
+    deleted: int = 0  # 删除的持久化缓存条数
 
 # --- 115转存与离线下载 ---
 class P115ShareFile(BaseModel):
@@ -164,7 +162,15 @@ class SubscriptionRequest(BaseModel):
     start_episode: int = 1         # 剧集必填，用户选择从第几集开始
     poster_path: Optional[str] = None
 
-class Subscription(BaseModel):
+class SubscriptionActionResponse(BaseModel):
+    success: bool = True
+    message: str = ""
+
+class Subscription(ServiceModel):
+    """
+    订阅记录。调度器每轮都会改写 message / next_check_time 等字段，
+    继承 ServiceModel：赋值时不做校验，加载旧数据时忽略多余字段。
+    """
     id: str                        # 唯一标识
     tmdb_id: int
     media_type: str
@@ -175,10 +181,12 @@ class Subscription(BaseModel):
     status: str = "active"         # active, completed, paused
     last_check_time: str = ""      # 上次检查时间
     next_check_time: str = ""      # 下次允许检查的时间
+    _next_check_ts: float = PrivateAttr(default=0.0) # next_check_time 的时间戳缓存 (不序列化)
     message: str = ""              # 状态描述
     
     # 存储配置
     save_cid: Optional[str] = None # [新增] 专属文件夹CID (剧集用)
+    save_path: Optional[str] = None # STRM 通知扫描的网盘路径 (添加订阅时计算一次)
 
     # 电影特有
     release_date: Optional[str] = None 
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Query, Path, HTTPException
 from typing import Optional, List
 from app.services.tmdb import tmdb_service
@@ -9,7 +10,7 @@ router = APIRouter(prefix="/tmdb", tags=["Metadata"])
 # --- 辅助接口 ---
 @router.get("/genres/{media_type}", response_model=List[Genre])
 async def get_genre_list(media_type: str = Path(..., pattern="^(movie|tv)$")):
-    raw_list = tmdb_service.get_genres(media_type)
+    raw_list = await tmdb_service.get_genres(media_type)
     return [Genre(id=g['id'], name=g['name']) for g in raw_list]
 
 # --- 核心发现接口 ---
@@ -33,7 +34,7 @@ async def discover_media(
     2. **高分经典**: sort_by=vote_average.desc & min_vote_count=1000
     3. **特定类型**: with_genres=18 (剧情)
     """
-    return tmdb_service.discover_media(
+    return await tmdb_service.discover_media(
         media_type=media_type,
         page=page,
         sort_by=sort_by,
@@ -53,14 +54,14 @@ async def get_trending_media(
     """
     获取今日或本周的趋势 (Trending)
     """
-    return tmdb_service.get_trending(media_type, time_window)
+    return await tmdb_service.get_trending(media_type, time_window)
 
 # --- 搜索 Search ---
 @router.get("/search", response_model=SearchResult)
 async def search_media(query: str, page: int = 1):
     if not query:
         raise HTTPException(status_code=400, detail="Query cannot be empty")
-    return tmdb_service.search_media(query, page)
+    return await tmdb_service.search_media(query, page)
 
 # --- 详情 Details ---
 @router.get("/details/{media_type}/{tmdb_id}", response_model=MediaDetail)
@@ -69,17 +70,19 @@ async def get_media_details(
     tmdb_id: int = Path(...)
 ):
     try:
-        # 1. Get TMDB Details
-        details = tmdb_service.get_details_full(media_type, tmdb_id)
-        
-        # 2. Check Availability via Nullbr SDK
+        # TMDB 详情与 Nullbr 资源可用性互不依赖，并发请求，耗时取两者中较慢者
         if media_type == 'movie':
-            avail = nullbr_service.get_movie_availability(tmdb_id)
+            avail_coro = nullbr_service.get_movie_availability(tmdb_id)
         else:
-            avail = nullbr_service.get_tv_availability(tmdb_id)
+            avail_coro = nullbr_service.get_tv_availability(tmdb_id)
+
+        details, avail = await asyncio.gather(
+            tmdb_service.get_details_full(media_type, tmdb_id),
+            avail_coro
+        )
         
-        details.availability = avail
-        return details
+        # 详情对象来自 TMDB 缓存，复制后再填充可用性，避免修改共享的缓存对象
+        return details.model_copy(update={"availability": avail})
         
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"Media not found or error: {str(e)}")
@@ -88,10 +91,10 @@ async def get_media_details(
 @router.get("/details/tv/{tmdb_id}/season/{season_number}", response_model=Season)
 async def get_season_details(tmdb_id: int, season_number: int):
     try:
-        season_data = tmdb_service.get_season_details(tmdb_id, season_number)
-        
-        avail = nullbr_service.get_season_availability(tmdb_id, season_number)
-        season_data.availability = avail
-        return season_data
+        season_data, avail = await asyncio.gather(
+            tmdb_service.get_season_details(tmdb_id, season_number),
+            nullbr_service.get_season_availability(tmdb_id, season_number)
+        )
+        return season_data.model_copy(update={"availability": avail})
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
\ No newline at end of file
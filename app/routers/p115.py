@@ -14,7 +14,7 @@ async def list_share_files(request: P115ShareListRequest):
     获取分享链接的文件列表。
     """
     try:
-        result = p115_service.get_share_file_list(
+        result = await p115_service.get_share_file_list(
             share_link=request.share_link,
             cid=request.cid,
             password=request.password
@@ -30,7 +30,7 @@ async def save_share_files(request: P115ShareSaveRequest):
     如果不指定 to_cid，将尝试保存到 env 配置的 P115_SAVE_PATH (并自动创建)。
     """
     try:
-        result = p115_service.save_share_files(
+        result = await p115_service.save_share_files(
             share_link=request.share_link,
             file_ids=request.file_ids,
             password=request.password,
@@ -51,7 +51,7 @@ async def add_offline_tasks(request: P115OfflineAddRequest):
     如果不指定 to_cid，将尝试保存到 env 配置的 P115_DOWNLOAD_PATH (并自动创建)。
     """
     try:
-        result = p115_service.add_offline_tasks(request.urls, to_cid=request.to_cid)
+        result = await p115_service.add_offline_tasks(request.urls, to_cid=request.to_cid)
         if not result["success"]:
              return P115Response(state=False, message=result["message"], data=result.get("raw"))
         return P115Response(state=True, message="离线任务添加成功", data=result.get("raw"))
@@ -65,7 +65,7 @@ async def list_user_files(request: P115FileListRequest):
     返回数据中包含 'path' 字段，显示当前路径结构，方便获取 CID。
     """
     try:
-        result = p115_service.list_files(
+        result = await p115_service.list_files(
             cid=request.cid,
             limit=request.limit,
             offset=request.offset
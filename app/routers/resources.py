@@ -1,122 +1,178 @@
 from fastapi import APIRouter, HTTPException, Query, Path
-from typing import List, Optional
+from fastapi.responses import Response, StreamingResponse
+from pydantic import TypeAdapter
+from typing import Dict, List, Optional
 from app.services.nullbr import nullbr_service
-from app.models.schemas import MediaResource, ResourceAvailability
+from app.models.schemas import MediaResource, ResourceAvailability, CacheInvalidateResponse
 
 router = APIRouter(prefix="/resources", tags=["Resources (Nullbr)"])
 
+# --- 辅助序列化 ---
+_RESOURCE_LIST = TypeAdapter(List[MediaResource])
+
+def _resource_response(resources: List[MediaResource]) -> Response:
+    """
+    资源列表由服务层构造，无需再次校验。
+    直接用 pydantic-core 序列化为 JSON，跳过 FastAPI 对 response_model 的逐项校验与转换。
+    """
+    return Response(_RESOURCE_LIST.dump_json(resources), media_type="application/json")
+
+def _upstream_error(e: Exception) -> HTTPException:
+    """将 Nullbr 请求异常转换为返回给前端的 HTTP 错误"""
+    if "429" in str(e):
+        # 返回 429 状态码给前端
+        return HTTPException(status_code=429, detail="Nullbr API 速率限制，请稍后再试。")
+    # 其他错误返回 500
+    return HTTPException(status_code=500, detail=str(e))
+
 # --- 辅助过滤函数 ---
+# 需要检查中文字幕的资源类型
+_ZH_CHECK_TYPES = frozenset({'magnet', 'ed2k'})
+
 def _filter_results(
     resources: List[MediaResource], 
     min_resolution: Optional[str], 
     require_zh: bool,
     source_type: Optional[str]
 ) -> List[MediaResource]:
-    filtered = []
-    for res in resources:
-        if source_type and res.link_type != source_type:
-            continue
-        if require_zh and res.link_type in ['magnet', 'ed2k'] and not res.has_chinese_subtitle:
-            continue
-        if min_resolution and res.resolution:
-            if min_resolution.lower() not in res.resolution.lower():
-                continue
-        filtered.append(res)
-    return filtered
+    # 循环不变量提前计算，避免每条资源重复 lower()
+    min_res = min_resolution.lower() if min_resolution else None
+    return [
+        res for res in resources
+        if (not source_type or res.link_type == source_type)
+        and not (require_zh and res.link_type in _ZH_CHECK_TYPES and not res.has_chinese_subtitle)
+        and not (min_res and res.resolution and min_res not in res.resolution.lower())
+    ]
 
 # --- Availability Checks (New) ---
 
 @router.get("/availability/tv/{tmdb_id}/season/{season_number}", response_model=ResourceAvailability)
-def check_season_availability(
+async def check_season_availability(
     tmdb_id: int,
     season_number: int
 ):
     """Check if resources exist for a specific TV season"""
-    return nullbr_service.get_season_availability(tmdb_id, season_number)
+    return await nullbr_service.get_season_availability(tmdb_id, season_number)
 
 @router.get("/availability/tv/{tmdb_id}/season/{season_number}/episode/{episode_number}", response_model=ResourceAvailability)
-def check_episode_availability(
+async def check_episode_availability(
     tmdb_id: int,
     season_number: int,
     episode_number: int
 ):
     """Check if resources exist for a specific TV episode"""
-    return nullbr_service.get_episode_availability(tmdb_id, season_number, episode_number)
+    return await nullbr_service.get_episode_availability(tmdb_id, season_number, episode_number)
+
+# --- 缓存管理 ---
+@router.delete("/cache/{tmdb_id}", response_model=CacheInvalidateResponse)
+async def invalidate_resource_cache(tmdb_id: int):
+    """清除某个 TMDB ID 的资源缓存 (内存 + 持久化)"""
+    return CacheInvalidateResponse(deleted=await nullbr_service.invalidate_cache(tmdb_id))
 
 # --- 电影接口 ---
 @router.get("/movie/{tmdb_id}", response_model=List[MediaResource])
-def get_movie_resources(
+async def get_movie_resources(
     tmdb_id: int,
     min_resolution: Optional[str] = Query(None),
     require_zh: bool = Query(False),
-    source_type: Optional[str] = Query(None, description="'115_share', 'magnet', 'ed2k'")
+    source_type: Optional[str] = Query(None, description="'115_share', 'magnet', 'ed2k'"),
+    refresh: bool = Query(False, description="跳过缓存，强制从 Nullbr 重新获取")
 ):
     """获取电影资源：整合 115分享 + 磁力 + Ed2k"""
     try:
-        results = nullbr_service.fetch_movie(tmdb_id, source_type)
-        return _filter_results(results, min_resolution, require_zh, source_type)
+        results = await nullbr_service.fetch_movie(tmdb_id, source_type, refresh)
+        return _resource_response(_filter_results(results, min_resolution, require_zh, source_type))
     except Exception as e:
-        if "429" in str(e):
-            # 返回 429 状态码给前端
-            raise HTTPException(
-                status_code=429, 
-                detail="Nullbr API 速率限制，请稍后再试。"
-            )
-        # 其他错误返回 500 或保持原样
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _upstream_error(e)
+
+@router.get("/movie/{tmdb_id}/stream")
+async def stream_movie_resources(
+    tmdb_id: int,
+    min_resolution: Optional[str] = Query(None),
+    require_zh: bool = Query(False),
+    source_type: Optional[str] = Query(None, description="'115_share', 'magnet', 'ed2k'"),
+    refresh: bool = Query(False, description="跳过缓存，强制从 Nullbr 重新获取")
+):
+    """
+    以 NDJSON 流式返回电影资源 (每行一个 MediaResource)，先返回的来源先输出。
+    第一批结果在响应开始前取得，此前的错误与普通接口一样返回 429/500；之后的错误只能中断连接
+    """
+    batches = nullbr_service.iter_movie(tmdb_id, source_type, refresh)
+    try:
+        first = await anext(batches, None)
+    except Exception as e:
+        await batches.aclose()
+        raise _upstream_error(e)
+
+    async def _ndjson():
+        try:
+            if first is None:
+                return
+            for res in _filter_results(first, min_resolution, require_zh, source_type):
+                yield res.model_dump_json() + "\n"
+            async for batch in batches:
+                for res in _filter_results(batch, min_resolution, require_zh, source_type):
+                    yield res.model_dump_json() + "\n"
+        finally:
+            await batches.aclose()
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
 
 # --- 电视剧接口 ---
 @router.get("/tv/{tmdb_id}", response_model=List[MediaResource])
-def get_tv_packs(tmdb_id: int):
+async def get_tv_packs(
+    tmdb_id: int,
+    refresh: bool = Query(False, description="跳过缓存，强制从 Nullbr 重新获取")
+):
     try:
-        return nullbr_service.fetch_tv_packs(tmdb_id)
+        return _resource_response(await nullbr_service.fetch_tv_packs(tmdb_id, refresh))
     except Exception as e:
-        if "429" in str(e):
-            # 返回 429 状态码给前端
-            raise HTTPException(
-                status_code=429, 
-                detail="Nullbr API 速率限制，请稍后再试。"
-            )
-        # 其他错误返回 500 或保持原样
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _upstream_error(e)
 
 @router.get("/tv/{tmdb_id}/season/{season_number}", response_model=List[MediaResource])
-def get_tv_season_resources(
+async def get_tv_season_resources(
     tmdb_id: int,
     season_number: int = Path(..., ge=0),
     min_resolution: Optional[str] = Query(None),
-    require_zh: bool = Query(False)
+    require_zh: bool = Query(False),
+    refresh: bool = Query(False, description="跳过缓存，强制从 Nullbr 重新获取")
 ):
-    results = nullbr_service.fetch_tv_season(tmdb_id, season_number)
     try:
-        return _filter_results(results, min_resolution, require_zh, None)
+        results = await nullbr_service.fetch_tv_season(tmdb_id, season_number, refresh)
+        return _resource_response(_filter_results(results, min_resolution, require_zh, None))
     except Exception as e:
-        if "429" in str(e):
-            # 返回 429 状态码给前端
-            raise HTTPException(
-                status_code=429, 
-                detail="Nullbr API 速率限制，请稍后再试。"
-            )
-        # 其他错误返回 500 或保持原样
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _upstream_error(e)
 
 @router.get("/tv/{tmdb_id}/season/{season_number}/episode/{episode_number}", response_model=List[MediaResource])
-def get_tv_episode_resources(
+async def get_tv_episode_resources(
     tmdb_id: int,
     season_number: int = Path(..., ge=0),
     episode_number: int = Path(..., ge=1),
     min_resolution: Optional[str] = Query(None),
-    require_zh: bool = Query(False)
+    require_zh: bool = Query(False),
+    refresh: bool = Query(False, description="跳过缓存，强制从 Nullbr 重新获取")
+):
+    try:
+        results = await nullbr_service.fetch_tv_episode(tmdb_id, season_number, episode_number, refresh)
+        return _resource_response(_filter_results(results, min_resolution, require_zh, None))
+    except Exception as e:
+        raise _upstream_error(e)
+
+@router.get("/tv/{tmdb_id}/season/{season_number}/episodes", response_model=Dict[int, List[MediaResource]])
+async def get_tv_episodes_resources(
+    tmdb_id: int,
+    season_number: int = Path(..., ge=0),
+    episodes: List[int] = Query(..., description="集数列表，例如 ?episodes=1&episodes=2"),
+    min_resolution: Optional[str] = Query(None),
+    require_zh: bool = Query(False),
+    refresh: bool = Query(False, description="跳过缓存，强制从 Nullbr 重新获取")
 ):
-    results = nullbr_service.fetch_tv_episode(tmdb_id, season_number, episode_number)
+    """批量获取一季中多集的资源，各集并发请求"""
     try:
-        return _filter_results(results, min_resolution, require_zh, None)
+        results = await nullbr_service.fetch_tv_season_all_episodes(tmdb_id, season_number, episodes, refresh)
+        return {
+            ep: _filter_results(res, min_resolution, require_zh, None)
+            for ep, res in results.items()
+        }
     except Exception as e:
-        if "429" in str(e):
-            # 返回 429 状态码给前端
-            raise HTTPException(
-                status_code=429, 
-                detail="Nullbr API 速率限制，请稍后再试。"
-            )
-        # 其他错误返回 500 或保持原样
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise _upstream_error(e)
\ No newline at end of file
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from app.services.subscription import subscription_service
-from app.models.schemas import SubscriptionRequest, Subscription
+from app.models.schemas import SubscriptionRequest, Subscription, SubscriptionActionResponse
 from typing import List
 
 router = APIRouter(prefix="/subscribe", tags=["Subscription"])
@@ -9,13 +9,13 @@ router = APIRouter(prefix="/subscribe", tags=["Subscription"])
 async def get_subscriptions():
     return subscription_service.get_list()
 
-@router.post("/add")
+@router.post("/add", response_model=SubscriptionActionResponse)
 async def add_subscription(req: SubscriptionRequest):
     result = await subscription_service.add_subscription(req)
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["message"])
-    return {"message": result["message"]}
+    return SubscriptionActionResponse(message=result["message"])
 
-@router.delete("/{sub_id}")
+@router.delete("/{sub_id}", response_model=SubscriptionActionResponse)
 async def delete_subscription(sub_id: str):
-    return subscription_service.delete_subscription(sub_id)
\ No newline at end of file
+    return await subscription_service.delete_subscription(sub_id)
\ No newline at end of file
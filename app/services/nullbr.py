@@ -1,7 +1,30 @@
+import asyncio
+import logging
+from itertools import chain
+from cachetools import TTLCache
 from nullbr import NullbrSDK
 from app.core.config import settings
+from app.core.ratelimit import RateLimiter
+from app.core.singleflight import SingleFlight
 from app.models.schemas import MediaResource, ResourceAvailability
-from typing import List, Optional
+from app.services.resource_cache import resource_cache
+from typing import AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 电影资源来源: link_type -> (SDK 方法名, 响应中的列表字段)
+_MOVIE_SOURCES = {
+    '115_share': ('get_movie_115', 'items'),
+    'magnet': ('get_movie_magnet', 'magnet'),
+    'ed2k': ('get_movie_ed2k', 'ed2k'),
+}
+
+# 各类 SDK Item 中存放链接的字段名: link_type -> 字段
+LINK_ATTR = {
+    '115_share': 'share_link',
+    'ed2k': 'ed2k',
+    'magnet': 'magnet',
+}
 
 class NullbrService:
     def __init__(self):
@@ -14,112 +37,256 @@ class NullbrService:
             )
         else:
             self.client = None
-            print("Warning: Nullbr API Key or App ID not set.")
+            logger.warning("Nullbr API Key or App ID not set.")
+
+        # 限制并发，突发流量下避免同时打满 Nullbr 触发 429
+        self._sem = asyncio.Semaphore(settings.NULLBR_MAX_CONCURRENCY)
+        # 平滑请求速率 (订阅追更时会连续请求多集)
+        self._limiter = RateLimiter(settings.NULLBR_RATE_LIMIT)
+
+        # 资源列表缓存: (类型, tmdb_id, ...) -> List[MediaResource]
+        # 先查进程内 TTL 缓存，再查 SQLite 持久化缓存 (resource_cache)。
+        # 内存缓存只在事件循环线程中读写，无需加锁；只缓存完整成功的结果
+        self._cache = TTLCache(maxsize=4096, ttl=settings.NULLBR_CACHE_TTL)
+        # 缓存未命中期间，相同 key 的并发请求只向上游发起一次
+        self._flight = SingleFlight()
+
+    async def _call(self, fn, *args):
+        """
+        Nullbr SDK 是同步实现 (内部带重试与 sleep)，放到线程中执行以免阻塞事件循环。
+        所有对外请求都经过速率限制与信号量限流。
+        """
+        await self._limiter.acquire()
+        async with self._sem:
+            return await asyncio.to_thread(fn, *args)
+
+    # 持久化缓存 (SQLite 查询与 JSON 编解码) 放到线程中执行，避免阻塞事件循环
+    async def _get_cached(self, key: tuple, refresh: bool = False) -> Optional[List[MediaResource]]:
+        if refresh:
+            return None
+        cached = self._cache.get(key)
+        if cached is None:
+            cached = await asyncio.to_thread(resource_cache.get, key)
+            if cached is not None:
+                self._cache[key] = cached
+        return cached
+
+    async def _set_cached(self, key: tuple, resources: List[MediaResource]):
+        self._cache[key] = resources
+        # 空结果通常意味着资源尚未出现，不做持久化，避免订阅长时间拿不到新资源
+        if resources:
+            await asyncio.to_thread(resource_cache.put, key, resources, settings.RESOURCE_CACHE_TTL_HOURS * 3600)
+
+    async def invalidate_cache(self, tmdb_id: int) -> int:
+        """清除某个 tmdb_id 的内存与持久化缓存"""
+        for key in [k for k in self._cache if k[1] == tmdb_id]:
+            self._cache.pop(key, None)
+        return await asyncio.to_thread(resource_cache.invalidate, tmdb_id)
 
     def _parse_sdk_item(self, item, link_type: str) -> MediaResource:
         """
         将 SDK 的各种 Item 对象统一转换为 MediaResource 模型
         """
-        title = getattr(item, 'title', getattr(item, 'name', 'Unknown'))
-        
-        link = ""
-        if link_type == '115_share':
-            link = getattr(item, 'share_link', '')
-        elif link_type == 'ed2k':
-            link = getattr(item, 'ed2k', '')
-        elif link_type == 'magnet':
-            link = getattr(item, 'magnet', '')
-
-        has_zh = False
-        if hasattr(item, 'zh_sub'):
-            has_zh = bool(getattr(item, 'zh_sub'))
-
-        return MediaResource(
-            title=title,
-            size=getattr(item, 'size', ''),
-            link=link,
+        # SDK 的 Item 均为 dataclass，一次取出实例字典，后续用 dict.get 代替多次 getattr 探测
+        get = vars(item).get
+        title = get('title') or get('name')
+
+        link = get(LINK_ATTR.get(link_type, ''))
+
+        # 字段归一化在此一次性完成，随后用 model_construct 跳过校验
+        quality = get('quality')
+        if isinstance(quality, list):
+            quality = ", ".join([str(i) for i in quality])
+        source = get('source')
+        if isinstance(source, list):
+            source = ", ".join([str(i) for i in source])
+
+        return MediaResource.model_construct(
+            title=title or 'Unknown',
+            size=get('size') or '',
+            link=link or '',
             link_type=link_type,
-            resolution=getattr(item, 'resolution', None),
-            quality=getattr(item, 'quality', None),
-            source=getattr(item, 'source', None),
-            has_chinese_subtitle=has_zh,
-            season_list=getattr(item, 'season_list', None)
+            resolution=get('resolution'),
+            quality=quality,
+            source=source,
+            has_chinese_subtitle=bool(get('zh_sub')),
+            season_list=get('season_list')
         )
 
     # --- Resource Fetching Methods ---
 
-    def fetch_movie(self, tmdb_id: int, source_type: Optional[str] = None) -> List[MediaResource]:
+    async def _fetch_movie_source(self, tmdb_id: int, link_type: str) -> List[MediaResource]:
+        """获取电影某一来源 (115 / 磁力 / Ed2k) 的资源"""
+        method, field = _MOVIE_SOURCES[link_type]
+        r = await self._call(getattr(self.client, method), tmdb_id)
+        items = getattr(r, field, None) if r else None
+        return [self._parse_sdk_item(i, link_type) for i in items] if items else []
+
+    async def _merge_results(self, results: list, context: str, cache_key: Optional[tuple] = None) -> List[MediaResource]:
+        """
+        合并 asyncio.gather(return_exceptions=True) 的结果：
+        失败的来源记录后跳过，遇到 429 则向上抛出交给路由处理。
+        所有来源都成功时写入缓存。
+        """
+        failed = False
+        for r in results:
+            if isinstance(r, Exception):
+                logger.error("Error fetching %s: %s", context, r)
+                if "429" in str(r):
+                    raise r
+                failed = True
+        # 一次性拼接各来源的结果，避免逐个 extend 带来的多次扩容
+        resources = list(chain.from_iterable(r for r in results if not isinstance(r, Exception)))
+        if cache_key is not None and not failed:
+            await self._set_cached(cache_key, resources)
+        return resources
+
+    async def fetch_movie(self, tmdb_id: int, source_type: Optional[str] = None, refresh: bool = False) -> List[MediaResource]:
         if not self.client: return []
+        key = ("movie", tmdb_id, source_type)
+        if (cached := await self._get_cached(key, refresh)) is not None:
+            return cached
+        return await self._flight.do(key, lambda: self._load_movie(key, tmdb_id, source_type))
+
+    async def _load_movie(self, key: tuple, tmdb_id: int, source_type: Optional[str]) -> List[MediaResource]:
+        # 各来源并发请求，总耗时取最慢的一个
+        results = await asyncio.gather(*[
+            self._fetch_movie_source(tmdb_id, link_type)
+            for link_type in _MOVIE_SOURCES
+            if not source_type or source_type == link_type
+        ], return_exceptions=True)
+        return await self._merge_results(results, f"movie resources for {tmdb_id}", cache_key=key)
+
+    async def iter_movie(self, tmdb_id: int, source_type: Optional[str] = None, refresh: bool = False) -> AsyncIterator[List[MediaResource]]:
+        """
+        按来源分批产出电影资源，各来源并发请求，先返回的先产出 (用于流式接口)。
+        命中缓存时一次性产出。
+        """
+        if not self.client: return
+        key = ("movie", tmdb_id, source_type)
+        if (cached := await self._get_cached(key, refresh)) is not None:
+            yield cached
+            return
+
         resources = []
+        failed = False
+        tasks = [
+            asyncio.create_task(self._fetch_movie_source(tmdb_id, link_type))
+            for link_type in _MOVIE_SOURCES
+            if not source_type or source_type == link_type
+        ]
         try:
-            if not source_type or source_type == '115_share':
-                r1 = self.client.get_movie_115(tmdb_id)
-                if r1 and r1.items: resources.extend([self._parse_sdk_item(i, '115_share') for i in r1.items])
-            
-            if not source_type or source_type == 'magnet':
-                r2 = self.client.get_movie_magnet(tmdb_id)
-                if r2 and r2.magnet: resources.extend([self._parse_sdk_item(i, 'magnet') for i in r2.magnet])
-                
-            if not source_type or source_type == 'ed2k':
-                r3 = self.client.get_movie_ed2k(tmdb_id)
-                if r3 and r3.ed2k: resources.extend([self._parse_sdk_item(i, 'ed2k') for i in r3.ed2k])
-        except Exception as e:
-            print(f"Error fetching movie resources for {tmdb_id}: {e}")
-            if "429" in str(e):
-                raise e
-        return resources
+            for fut in asyncio.as_completed(tasks):
+                try:
+                    batch = await fut
+                except Exception as e:
+                    logger.error("Error fetching movie resources for %s: %s", tmdb_id, e)
+                    if "429" in str(e):
+                        raise e
+                    failed = True
+                    continue
+                resources.extend(batch)
+                yield batch
+        finally:
+            # 遇到 429 或客户端断开时提前结束：取消仍在请求的来源，并取出已完成来源的异常
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()
+        if not failed:
+            await self._set_cached(key, resources)
 
-    def fetch_tv_packs(self, tmdb_id: int) -> List[MediaResource]:
+    async def fetch_tv_packs(self, tmdb_id: int, refresh: bool = False) -> List[MediaResource]:
         """仅获取剧集的 115 整合包"""
         if not self.client: return []
+        key = ("tv_packs", tmdb_id)
+        if (cached := await self._get_cached(key, refresh)) is not None:
+            return cached
+        return await self._flight.do(key, lambda: self._load_tv_packs(key, tmdb_id))
+
+    async def _load_tv_packs(self, key: tuple, tmdb_id: int) -> List[MediaResource]:
         try:
-            r = self.client.get_tv_115(tmdb_id)
-            if r and r.items:
-                return [self._parse_sdk_item(i, '115_share') for i in r.items]
+            r = await self._call(self.client.get_tv_115, tmdb_id)
+            resources = [self._parse_sdk_item(i, '115_share') for i in r.items] if r and r.items else []
+            await self._set_cached(key, resources)
+            return resources
         except Exception as e:
-            print(f"Error fetching TV packs for {tmdb_id}: {e}")
+            logger.error("Error fetching TV packs for %s: %s", tmdb_id, e)
             if "429" in str(e):
                 raise e
         return []
 
-    def fetch_tv_season(self, tmdb_id: int, season_number: int) -> List[MediaResource]:
+    async def fetch_tv_season(self, tmdb_id: int, season_number: int, refresh: bool = False) -> List[MediaResource]:
         """获取特定季度的资源"""
         if not self.client: return []
+        key = ("tv_season", tmdb_id, season_number)
+        if (cached := await self._get_cached(key, refresh)) is not None:
+            return cached
+        return await self._flight.do(key, lambda: self._load_tv_season(key, tmdb_id, season_number))
+
+    async def _load_tv_season(self, key: tuple, tmdb_id: int, season_number: int) -> List[MediaResource]:
         resources = []
         try:
-            r = self.client.get_tv_season_magnet(tmdb_id, season_number)
+            r = await self._call(self.client.get_tv_season_magnet, tmdb_id, season_number)
             if r and r.magnet:
                 resources.extend([self._parse_sdk_item(i, 'magnet') for i in r.magnet])
+            await self._set_cached(key, resources)
         except Exception as e:
-            print(f"Error fetching TV Season {season_number}: {e}")
+            logger.error("Error fetching TV Season %s: %s", season_number, e)
             if "429" in str(e):
                 raise e
         return resources
 
-    def fetch_tv_episode(self, tmdb_id: int, season_number: int, episode_number: int) -> List[MediaResource]:
-        """获取特定集数的资源"""
+    async def _fetch_episode_source(self, tmdb_id: int, season_number: int, episode_number: int, link_type: str) -> List[MediaResource]:
+        if link_type == 'magnet':
+            r = await self._call(self.client.get_tv_episode_magnet, tmdb_id, season_number, episode_number)
+            items = r.magnet if r else None
+        else:
+            r = await self._call(self.client.get_tv_episode_ed2k, tmdb_id, season_number, episode_number)
+            items = r.ed2k if r else None
+        return [self._parse_sdk_item(i, link_type) for i in items] if items else []
+
+    async def fetch_tv_episode(self, tmdb_id: int, season_number: int, episode_number: int, refresh: bool = False) -> List[MediaResource]:
+        """获取特定集数的资源 (磁力与 Ed2k 并发请求)"""
         if not self.client: return []
-        resources = []
-        try:
-            r_mag = self.client.get_tv_episode_magnet(tmdb_id, season_number, episode_number)
-            if r_mag and r_mag.magnet:
-                resources.extend([self._parse_sdk_item(i, 'magnet') for i in r_mag.magnet])
+        key = ("tv_episode", tmdb_id, season_number, episode_number)
+        if (cached := await self._get_cached(key, refresh)) is not None:
+            return cached
+        return await self._flight.do(key, lambda: self._load_tv_episode(key, tmdb_id, season_number, episode_number))
 
-            r_ed2k = self.client.get_tv_episode_ed2k(tmdb_id, season_number, episode_number)
-            if r_ed2k and r_ed2k.ed2k:
-                resources.extend([self._parse_sdk_item(i, 'ed2k') for i in r_ed2k.ed2k])
-        except Exception as e:
-            print(f"Error fetching TV Episode S{season_number}E{episode_number}: {e}")
-            if "429" in str(e):
-                raise e
-        return resources
+    async def _load_tv_episode(self, key: tuple, tmdb_id: int, season_number: int, episode_number: int) -> List[MediaResource]:
+        results = await asyncio.gather(
+            self._fetch_episode_source(tmdb_id, season_number, episode_number, 'magnet'),
+            self._fetch_episode_source(tmdb_id, season_number, episode_number, 'ed2k'),
+            return_exceptions=True
+        )
+        return await self._merge_results(results, f"TV Episode S{season_number}E{episode_number}", cache_key=key)
+
+    async def fetch_tv_season_all_episodes(self, tmdb_id: int, season_number: int, episode_numbers: List[int], refresh: bool = False) -> Dict[int, List[MediaResource]]:
+        """
+        并发获取一季中多集的资源，返回 {集数: 资源列表}。
+        并发度由 _call 中的信号量统一控制，这里不再额外加锁 (嵌套获取同一信号量会死锁)。
+        """
+        if not self.client: return {ep: [] for ep in episode_numbers}
+        results = await asyncio.gather(*[
+            self.fetch_tv_episode(tmdb_id, season_number, ep, refresh) for ep in episode_numbers
+        ], return_exceptions=True)
+
+        episodes = {}
+        for ep, r in zip(episode_numbers, results):
+            if isinstance(r, Exception):
+                # fetch_tv_episode 只会向上抛出 429
+                raise r
+            episodes[ep] = r
+        return episodes
 
     # --- 资源性检查 ---
 
-    def get_movie_availability(self, tmdb_id: int) -> ResourceAvailability:
+    async def get_movie_availability(self, tmdb_id: int) -> ResourceAvailability:
         if not self.client: return ResourceAvailability()
         try:
-            r = self.client.get_movie(tmdb_id)
+            r = await self._call(self.client.get_movie, tmdb_id)
             return ResourceAvailability(
                 has_115=r.has_115,
                 has_magnet=r.has_magnet,
@@ -129,10 +296,10 @@ class NullbrService:
         except Exception:
             return ResourceAvailability()
 
-    def get_tv_availability(self, tmdb_id: int) -> ResourceAvailability:
+    async def get_tv_availability(self, tmdb_id: int) -> ResourceAvailability:
         if not self.client: return ResourceAvailability()
         try:
-            r = self.client.get_tv(tmdb_id)
+            r = await self._call(self.client.get_tv, tmdb_id)
             return ResourceAvailability(
                 has_115=r.has_115,
                 has_magnet=r.has_magnet,
@@ -142,20 +309,20 @@ class NullbrService:
         except Exception:
             return ResourceAvailability()
     
-    def get_season_availability(self, tmdb_id: int, season_number: int) -> ResourceAvailability:
+    async def get_season_availability(self, tmdb_id: int, season_number: int) -> ResourceAvailability:
         if not self.client: return ResourceAvailability()
         try:
-            r = self.client.get_tv_season(tmdb_id, season_number)
+            r = await self._call(self.client.get_tv_season, tmdb_id, season_number)
             return ResourceAvailability(
                 has_magnet=r.has_magnet
             )
         except Exception:
             return ResourceAvailability()
 
-    def get_episode_availability(self, tmdb_id: int, season_number: int, episode_number: int) -> ResourceAvailability:
+    async def get_episode_availability(self, tmdb_id: int, season_number: int, episode_number: int) -> ResourceAvailability:
         if not self.client: return ResourceAvailability()
         try:
-            r = self.client.get_tv_episode(tmdb_id, season_number, episode_number)
+            r = await self._call(self.client.get_tv_episode, tmdb_id, season_number, episode_number)
             return ResourceAvailability(
                 has_magnet=r.has_magnet,
                 has_ed2k=r.has_ed2k
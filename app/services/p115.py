@@ -1,15 +1,131 @@
+import asyncio
+import json
+import logging
 import os
 from functools import lru_cache
+from itertools import chain
 from typing import List, Dict, Any, Optional, Union
 from pathlib import Path
+from types import MappingProxyType
 from p115client import P115Client
 from p115client.util import share_extract_payload
 from app.core.config import settings
 from app.services.strm import strm_service
 
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=2048)
+def _extract_share(share_link: str) -> MappingProxyType:
+    """解析分享链接 (按链接缓存)，返回只读映射防止缓存内容被修改"""
+    return MappingProxyType(share_extract_payload(share_link))
+
+# 路径 -> CID 映射的持久化文件，重启后无需重新查询
+CID_CACHE_FILE = "data/cid_cache.json"
+
+# share_snap 单页最大条数
+SHARE_PAGE_SIZE = 1000
+
+# 以 .iso 结尾的分享项强制视为文件 (避免对每个文件名调用 lower)
+ISO_SUFFIX = ('.iso', '.ISO')
+
+def _parse_share_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    解析 115 Share 列表项
+    文件夹: 通常没有 fid, cid 为文件夹ID, pid 为父ID, fo=1
+    文件: fid 为文件ID, cid 为父ID, fo=0 或不存在
+    """
+    get = item.get
+    fid = get("fid")
+    name = get("n", "")
+
+    # 1. 如果文件名以 .iso 结尾，强制视为文件 (is_dir=False)
+    # 2. 否则，如果 fo=1 或没有 fid，视为目录
+    is_dir = not name.endswith(ISO_SUFFIX) and (get("fo") == 1 or not fid)
+
+    # ID 分配逻辑
+    if is_dir:
+        item_id, parent_id = get("cid"), get("pid")
+    else:
+        item_id, parent_id = fid, get("cid")
+
+    return {
+        "id": str(item_id),
+        "parent_id": str(parent_id),
+        "name": name,
+        "size": str(get("s")),
+        "is_dir": is_dir,
+        "pick_code": get("pc"),
+        "sha1": get("sha"),
+    }
+
+def _parse_fs_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    解析个人网盘 (fs_files) 列表项
+    文件: { "fid": "...", "cid": "父目录ID", "n": "name" ... }
+    目录: { "cid": "目录ID", "pid": "父目录ID", "n": "name" ... }
+    """
+    get = item.get
+    # 判断是否为目录：通常目录没有 'fid'，或者有 'cid' 作为它的ID
+    is_dir = "fid" not in item
+
+    if is_dir:
+        item_id, parent_id = get("cid"), get("pid")
+    else:
+        item_id, parent_id = get("fid"), get("cid")
+
+    return {
+        "id": str(item_id),
+        "parent_id": str(parent_id),
+        "name": get("n", "Unknown"),
+        "size": str(get("s", 0)),
+        "is_dir": is_dir,
+        "pick_code": get("pc", ""),
+        "time": get("t", "") or get("upt", ""), # 修改时间
+    }
+
 class P115Service:
     def __init__(self):
         self._client: Optional[P115Client] = None
+        # 配置路径 -> CID 的缓存，目录 ID 基本不变，持久化到 CID_CACHE_FILE
+        self._cid_cache: Dict[str, int] = self._load_cid_cache()
+        self._cid_lock = asyncio.Lock()
+        # 串行化 CID 缓存文件的写入，保证最后写入的是最新的快照
+        self._cid_save_lock = asyncio.Lock()
+        # 所有线程共用一个 P115Client (同一 Cookie、同一连接池)，用信号量限制同时占用的线程/连接数，
+        # 避免大量并发时在连接池上排队，也降低触发 115 风控的概率
+        self._sem = asyncio.Semaphore(settings.P115_MAX_CONCURRENCY)
+
+    @staticmethod
+    def _load_cid_cache() -> Dict[str, int]:
+        try:
+            with open(CID_CACHE_FILE, "r", encoding="utf-8") as f:
+                return {k: int(v) for k, v in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning("Ignoring corrupt CID cache file: %s", e)
+            return {}
+
+    async def _save_cid_cache(self):
+        """
+        持久化 CID 缓存，文件写入放到线程中执行，避免阻塞事件循环。
+        写入失败只记录日志：内存中的缓存仍然有效，不影响调用方
+        """
+        async with self._cid_save_lock:
+            snapshot = dict(self._cid_cache)
+            try:
+                await asyncio.to_thread(self._write_cid_cache, snapshot)
+            except OSError as e:
+                logger.error("Failed to save CID cache: %s", e)
+
+    @staticmethod
+    def _write_cid_cache(data: Dict[str, int]):
+        """原子写入：先写临时文件再 os.replace，避免中途崩溃留下半截文件"""
+        os.makedirs(os.path.dirname(CID_CACHE_FILE), exist_ok=True)
+        tmp = CID_CACHE_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, CID_CACHE_FILE)
 
     @property
     def client(self) -> P115Client:
@@ -21,13 +137,42 @@ class P115Service:
             self._client = P115Client(settings.P115_COOKIE, check_for_relogin=True)
         return self._client
 
-    def get_target_cid(self, path_config: str, manual_cid: Optional[str] = None) -> int:
+    async def _call(self, fn, *args, **kwargs):
+        """P115Client 是同步客户端，放到线程池执行，避免阻塞事件循环"""
+        async with self._sem:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def get_target_cid(self, path_config: str, manual_cid: Optional[str] = None) -> int:
         """
         获取目标目录 CID。
         """
         if manual_cid:
             return int(manual_cid)
-        
+
+        cid = self._cid_cache.get(path_config)
+        if cid is not None:
+            return cid
+        # 加锁解析，避免并发请求重复创建同一目录
+        async with self._cid_lock:
+            cid = self._cid_cache.get(path_config)
+            if cid is not None:
+                return cid
+            cid = await self._resolve_cid(path_config)
+            self._cid_cache[path_config] = cid
+        # 写文件不占用解析锁
+        await self._save_cid_cache()
+        return cid
+
+    async def invalidate_cid(self, path_config: Optional[str] = None):
+        """清除 CID 缓存 (目录在外部被删除或移动时使用)，不传路径则全部清除"""
+        if path_config is None:
+            self._cid_cache.clear()
+        elif self._cid_cache.pop(path_config, None) is None:
+            return
+        await self._save_cid_cache()
+
+    async def _resolve_cid(self, path_config: str) -> int:
+        """通过 115 接口查询路径对应的 CID，不存在则创建"""
         path_str = path_config
         # 如果配置明确是根目录，直接返回 0
         if not path_str or path_str == "/" or path_str == "\\":
@@ -40,7 +185,7 @@ class P115Service:
             path = "/" + path
 
         # 1. 尝试直接获取 ID
-        resp = self.client.fs_dir_getid(path)
+        resp = await self._call(self.client.fs_dir_getid, path)
         
         pid = -1
         if resp.get("state"):
@@ -68,7 +213,7 @@ class P115Service:
         if not create_path: # 防止为空字符串
             return 0
             
-        resp = self.client.fs_makedirs_app(create_path, pid=0)
+        resp = await self._call(self.client.fs_makedirs_app, create_path, pid=0)
         
         if not resp.get("state"):
              raise ValueError(f"Failed to create path '{create_path}': {resp.get('error')}")
@@ -95,66 +240,44 @@ class P115Service:
 
         raise ValueError(f"Failed to resolve CID for path '{path}'. Response: {resp}")
 
-    def get_share_file_list(self, share_link: str, cid: str = "0", password: Optional[str] = None) -> Dict[str, Any]:
+    async def get_share_file_list(self, share_link: str, cid: str = "0", password: Optional[str] = None) -> Dict[str, Any]:
         """
         获取分享链接的文件列表。
         """
-        payload = share_extract_payload(share_link)
+        payload = _extract_share(share_link)
         share_code = payload["share_code"]
         receive_code = password if password else payload.get("receive_code", "")
 
-        resp = self.client.share_snap({
-            "share_code": share_code,
-            "receive_code": receive_code,
-            "cid": cid,
-            "limit": 1000
-        })
+        def snap_payload(offset: int) -> Dict[str, Any]:
+            return {
+                "share_code": share_code,
+                "receive_code": receive_code,
+                "cid": cid,
+                "offset": offset,
+                "limit": SHARE_PAGE_SIZE
+            }
+
+        resp = await self._call(self.client.share_snap, snap_payload(0))
 
         if not resp.get("state"):
             raise ValueError(f"Failed to list share files: {resp.get('error')}")
 
         data = resp.get("data", {})
         file_list = data.get("list", [])
+
+        # 超过一页时，剩余分页互不依赖，按 offset 并发获取
+        total = int(data.get("count") or 0)
+        if total > SHARE_PAGE_SIZE:
+            pages = await asyncio.gather(*[
+                self._call(self.client.share_snap, snap_payload(offset))
+                for offset in range(SHARE_PAGE_SIZE, total, SHARE_PAGE_SIZE)
+            ])
+            for page in pages:
+                if not page.get("state"):
+                    raise ValueError(f"Failed to list share files: {page.get('error')}")
+            file_list = chain(file_list, *(page.get("data", {}).get("list", []) for page in pages))
         
-        results = []
-        for item in file_list:
-            # 解析 115 Share 列表项
-            # 文件夹: 通常没有 fid, cid 为文件夹ID, pid 为父ID, fo=1
-            # 文件: fid 为文件ID, cid 为父ID, fo=0 或不存在
-            
-            fid = item.get("fid")
-            cid_val = item.get("cid")
-            pid_val = item.get("pid")
-            name = item.get("n", "")
-            
-            # 逻辑修正：
-            # 1. 如果文件名以 .iso 结尾，强制视为文件 (is_dir=False)
-            # 2. 否则，如果 fo=1 或没有 fid，视为目录
-            
-            is_iso = name.lower().endswith('.iso')
-            
-            if is_iso:
-                is_dir = False
-            else:
-                is_dir = (item.get("fo") == 1) or (not fid)
-
-            # ID 分配逻辑
-            if is_dir:
-                item_id = cid_val
-                parent_id = pid_val
-            else:
-                item_id = fid
-                parent_id = cid_val
-
-            results.append({
-                "id": str(item_id),
-                "parent_id": str(parent_id),
-                "name": name,
-                "size": str(item.get("s")),
-                "is_dir": is_dir,
-                "pick_code": item.get("pc"),
-                "sha1": item.get("sha"),
-            })
+        results = [_parse_share_item(item) for item in file_list]
         
         return {
             "count": data.get("count"),
@@ -162,14 +285,14 @@ class P115Service:
             "share_info": data.get("share_info")
         }
 
-    def save_share_files(self, share_link: str, file_ids: List[str], password: Optional[str] = None, to_cid: Optional[str] = None, save_path_str: Optional[str] = None, new_directory_name: Optional[str] = None) -> Dict[str, Any]:
+    async def save_share_files(self, share_link: str, file_ids: List[str], password: Optional[str] = None, to_cid: Optional[str] = None, save_path_str: Optional[str] = None, new_directory_name: Optional[str] = None) -> Dict[str, Any]:
         """
         转存文件。
         :param save_path_str: 明确的目标路径字符串（用于 STRM 生成通知）。如果未提供且 to_cid 为空，则使用默认配置路径。
         """
-        save_cid = self.get_target_cid(settings.P115_SAVE_PATH, to_cid)
+        save_cid = await self.get_target_cid(settings.P115_SAVE_PATH, to_cid)
         notify_path = save_path_str if save_path_str else settings.P115_SAVE_PATH
-        payload_info = share_extract_payload(share_link)
+        payload_info = _extract_share(share_link)
         share_code = payload_info["share_code"]
         receive_code = password if password else payload_info.get("receive_code", "")
 
@@ -178,7 +301,7 @@ class P115Service:
         if new_directory_name:
             try:
                 # 在当前 save_cid 下创建新文件夹
-                resp = self.client.fs_makedirs_app(new_directory_name, pid=save_cid)
+                resp = await self._call(self.client.fs_makedirs_app, new_directory_name, pid=save_cid)
                 if not resp.get("state"):
                      raise ValueError(f"Failed to create subdir '{new_directory_name}': {resp.get('error')}")
                 
@@ -205,7 +328,7 @@ class P115Service:
                         notify_path = os.path.join(notify_path, new_directory_name)
                 else:
                     # 如果创建成功但无法获取 ID，打印警告，文件将被存入父目录
-                    print(f"Warning: Created folder '{new_directory_name}' but failed to extract CID. Response: {resp}")
+                    logger.warning("Created folder '%s' but failed to extract CID. Response: %s", new_directory_name, resp)
 
             except Exception as e:
                 return {"success": False, "message": f"创建整理文件夹失败: {str(e)}", "raw": {}}
@@ -218,14 +341,21 @@ class P115Service:
             "is_check": 0,
         }
 
-        resp = self.client.share_receive(payload)
+        resp = await self._call(self.client.share_receive, payload)
         
         if not resp.get("state"):
+            # 目标目录可能已在外部被删除，清除缓存的 CID，下次重新解析
+            if not to_cid:
+                await self.invalidate_cid(settings.P115_SAVE_PATH)
             return {"success": False, "message": resp.get("error"), "raw": resp}
+
+        # 转存成功后通知 STRM 生成：只入队，由 StrmService 在后台发送，不延迟接口响应
+        if notify_path:
+            await strm_service.notify_gen_by_path(notify_path)
         
         return {"success": True, "message": "Saved successfully", "raw": resp}
 
-    def add_offline_tasks(self, urls: List[str], to_cid: Optional[str] = None, save_path_str: Optional[str] = None) -> Dict[str, Any]:
+    async def add_offline_tasks(self, urls: List[str], to_cid: Optional[str] = None, save_path_str: Optional[str] = None) -> Dict[str, Any]:
         """
         离线下载。
         :param save_path_str: 明确的目标路径字符串（用于 STRM 生成通知）。
@@ -233,39 +363,41 @@ class P115Service:
         if not urls:
             return {"success": False, "message": "No URLs provided"}
 
-        save_cid = self.get_target_cid(settings.P115_DOWNLOAD_PATH, to_cid)
+        save_cid = await self.get_target_cid(settings.P115_DOWNLOAD_PATH, to_cid)
 
         payload = {
             "savepath": "", 
-            "wp_path_id": save_cid
+            "wp_path_id": save_cid,
+            **{f"url[{i}]": url.strip() for i, url in enumerate(urls)}
         }
-        
-        for i, url in enumerate(urls):
-            payload[f"url[{i}]"] = url.strip()
 
-        resp = self.client.offline_add_urls(payload)
+        resp = await self._call(self.client.offline_add_urls, payload)
 
         if not resp.get("state"):
+             # 目标目录可能已在外部被删除，清除缓存的 CID，下次重新解析
+             if not to_cid:
+                 await self.invalidate_cid(settings.P115_DOWNLOAD_PATH)
              return {"success": False, "message": resp.get("error_msg") or resp.get("error"), "raw": resp}
 
         # 注意：离线任务是异步的，文件此时可能并未下载完成。
         # 但 P115StrmHelper 的 api_strm_sync_create_by_path 是扫描目录。
         # 如果下载很快（如秒传），现在扫描是有效的。
         # 如果下载很慢，可能需要后续再次扫描。
+        # 通知只入队，由 StrmService 在后台合并发送，不占用接口响应时间
         try:
             notify_path = save_path_str if save_path_str else settings.P115_DOWNLOAD_PATH
             if notify_path:
-                strm_service.notify_gen_by_path(notify_path)
+                await strm_service.notify_gen_by_path(notify_path)
         except Exception as e:
-             print(f"Failed to trigger STRM gen: {e}")
+             logger.error("Failed to trigger STRM gen: %s", e)
 
         return {"success": True, "message": "Tasks added successfully", "raw": resp}
 
-    def list_files(self, cid: str = "0", limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+    async def list_files(self, cid: str = "0", limit: int = 100, offset: int = 0) -> Dict[str, Any]:
         """
         列出个人网盘文件 (fs_files)。
         """
-        resp = self.client.fs_files({
+        resp = await self._call(self.client.fs_files, {
             "cid": cid,
             "limit": limit,
             "offset": offset,
@@ -292,28 +424,7 @@ class P115Service:
             path_list = raw_data.get("path", [])
             count = raw_data.get("count", 0)
         
-        results = []
-        for item in file_list:
-            # 判断是否为目录：通常目录没有 'fid'，或者有 'cid' 作为它的ID
-            # 115 API: 
-            #   文件: { "fid": "...", "cid": "父目录ID", "n": "name" ... }
-            #   目录: { "cid": "目录ID", "pid": "父目录ID", "n": "name" ... }
-            
-            is_dir = "fid" not in item
-            
-            # 提取 ID
-            item_id = item.get("cid") if is_dir else item.get("fid")
-            parent_id = item.get("pid") if is_dir else item.get("cid")
-            
-            results.append({
-                "id": str(item_id),
-                "parent_id": str(parent_id),
-                "name": item.get("n", "Unknown"),
-                "size": str(item.get("s", 0)),
-                "is_dir": is_dir,
-                "pick_code": item.get("pc", ""),
-                "time": item.get("t", "") or item.get("upt", ""), # 修改时间
-            })
+        results = [_parse_fs_item(item) for item in file_list]
             
         return {
             "count": count,
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import threading
+import time
+from pydantic import TypeAdapter
+from typing import List, Optional
+from app.models.schemas import MediaResource
+
+DB_FILE = "data/resource_cache.db"
+
+_RESOURCE_LIST = TypeAdapter(List[MediaResource])
+
+class ResourceCache:
+    """
+    Nullbr 资源列表的持久化缓存 (SQLite)。
+    进程重启后依然有效，多个 worker 共享同一份数据。
+    key 与 NullbrService 的内存缓存一致: (类型, tmdb_id, 其余参数...)
+    """
+    def __init__(self, path: str = DB_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS resources (
+                    kind TEXT NOT NULL,
+                    tmdb_id INTEGER NOT NULL,
+                    variant TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (kind, tmdb_id, variant)
+                )
+            """)
+            self._conn.execute("DELETE FROM resources WHERE expires_at < ?", (time.time(),))
+
+    @staticmethod
+    def _split_key(key: tuple):
+        kind, tmdb_id, *rest = key
+        return kind, tmdb_id, ":".join("" if v is None else str(v) for v in rest)
+
+    def get(self, key: tuple) -> Optional[List[MediaResource]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM resources WHERE kind = ? AND tmdb_id = ? AND variant = ? AND expires_at >= ?",
+                (*self._split_key(key), time.time())
+            ).fetchone()
+        if not row:
+            return None
+        return _RESOURCE_LIST.validate_json(row[0])
+
+    def put(self, key: tuple, resources: List[MediaResource], ttl: float):
+        payload = _RESOURCE_LIST.dump_json(resources)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?)",
+                (*self._split_key(key), payload, time.time() + ttl)
+            )
+
+    def invalidate(self, tmdb_id: int) -> int:
+        """删除某个 tmdb_id 的全部缓存，返回删除条数"""
+        with self._lock, self._conn:
+            cur = self._conn.execute("DELETE FROM resources WHERE tmdb_id = ?", (tmdb_id,))
+            return cur.rowcount
+
+resource_cache = ResourceCache()
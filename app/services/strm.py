@@ -1,10 +1,43 @@
-import requests
-import json
+import asyncio
+import contextlib
+import httpx
+import logging
+import orjson
+from typing import List
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+def _log_task_errors(task: asyncio.Task):
+    """后台任务异常退出时记录日志，避免错误被静默吞掉"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("[STRM] Background task %s failed", task.get_name(), exc_info=task.exception())
+
 class StrmService:
+    # 合并通知: 攒够 BATCH_SIZE 条或等待 BATCH_WAIT 秒后一次性发送
+    BATCH_SIZE = 32
+    BATCH_WAIT = 0.5
+
     def __init__(self):
-        pass
+        # 复用同一个连接池，避免每次通知都重新建立 TCP/TLS 连接
+        self._client = httpx.AsyncClient(
+            timeout=10.0, # 设置超时防止阻塞太久
+            headers={"Content-Type": "application/json"},
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2, keepalive_expiry=60)
+        )
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # 发送协程在第一次通知时才启动 (模块导入时还没有事件循环)
+        self._flusher_task = None
+
+    async def aclose(self):
+        if self._flusher_task:
+            # 等待队列中剩余的通知发出后再关闭连接池
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._queue.join(), timeout=15)
+            self._flusher_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher_task
+        await self._client.aclose()
 
     def _get_api_url(self):
         if not settings.MOVIEPILOT_URL:
@@ -12,15 +45,41 @@ class StrmService:
         base = settings.MOVIEPILOT_URL.rstrip('/')
         return f"{base}/api/v1/plugin/P115StrmHelper/api_strm_sync_create_by_path"
 
-    def notify_gen_by_path(self, pan_path: str):
+    async def notify_gen_by_path(self, pan_path: str):
         """
-        通知 MoviePilot 根据网盘路径生成 STRM
+        通知 MoviePilot 根据网盘路径生成 STRM。
+        只负责入队并立即返回，短时间内的多个路径会合并为一次请求。
         """
+        if not self._get_api_url() or not settings.MOVIEPILOT_APIKEY or not pan_path:
+            # 如果没配置，则静默跳过
+            return
+
+        if self._flusher_task is None or self._flusher_task.done():
+            self._flusher_task = asyncio.create_task(self._flusher(), name="strm-notify-flusher")
+            self._flusher_task.add_done_callback(_log_task_errors)
+        await self._queue.put(pan_path)
+
+    async def _flusher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.BATCH_WAIT
+            while len(batch) < self.BATCH_SIZE and (remaining := deadline - loop.time()) > 0:
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                # 同一批次内的重复路径只发送一次
+                await self._post(list(dict.fromkeys(batch)))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _post(self, pan_paths: List[str]):
         api_url = self._get_api_url()
         api_key = settings.MOVIEPILOT_APIKEY
-        
-        if not api_url or not api_key or not pan_path:
-            # 如果没配置，则静默跳过
+        if not api_url or not api_key:
             return
 
         # 构造文档中要求的 payload
@@ -28,8 +87,9 @@ class StrmService:
         payload = {
             "data": [
                 {
-                    "pan_media_path": pan_path
+                    "pan_media_path": p
                 }
+                for p in pan_paths
             ],
             # 设为 True 以便生成后立即刮削和刷新
             "scrape_metadata": True,
@@ -37,26 +97,24 @@ class StrmService:
         }
 
         try:
-            print(f"[STRM] Triggering generation for path: {pan_path}")
-            resp = requests.post(
+            logger.info("[STRM] Triggering generation for paths: %s", pan_paths)
+            resp = await self._client.post(
                 api_url,
                 params={"apikey": api_key},
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=10 # 设置超时防止阻塞太久
+                content=orjson.dumps(payload) # Content-Type 已在客户端默认头中设置
             )
             
             if resp.status_code == 200:
-                res_json = resp.json()
+                res_json = orjson.loads(resp.content)
                 if res_json.get("code") == 10200:
                     data = res_json.get("data", {})
-                    print(f"[STRM] Success: Generated {data.get('success_count', 0)} files.")
+                    logger.info("[STRM] Success: Generated %s files.", data.get('success_count', 0))
                 else:
-                    print(f"[STRM] Plugin Error: {res_json.get('msg')}")
+                    logger.warning("[STRM] Plugin Error: %s", res_json.get('msg'))
             else:
-                print(f"[STRM] HTTP Error: {resp.status_code} - {resp.text}")
+                logger.warning("[STRM] HTTP Error: %s - %s", resp.status_code, resp.text)
 
         except Exception as e:
-            print(f"[STRM] Request Failed: {e}")
+            logger.error("[STRM] Request Failed: %s", e)
 
-strm_service = StrmService()
\ No newline at end of file
+strm_service = StrmService()
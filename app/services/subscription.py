@@ -1,54 +1,176 @@
-import json
+import contextlib
+import orjson
 import os
 import asyncio
+import logging
 import re
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+import sqlite3
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Optional, Set, Tuple
 from app.models.schemas import Subscription, SubscriptionRequest
-from app.services.tmdb import tmdb_service
+from app.services.tmdb import tmdb_service, DETAILS_BASIC
 from app.services.nullbr import nullbr_service
 from app.services.p115 import p115_service
 from app.core.config import settings
 
-DATA_FILE = "data/subscriptions.json"
+logger = logging.getLogger(__name__)
+
+DB_FILE = "data/subscriptions.db"
+LEGACY_DATA_FILE = "data/subscriptions.json"
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+# 剧集追更时一次预取的集数
+PREFETCH_EPISODES = 5
+# 调度器两次检查之间的休眠上下限 (秒)
+SCHEDULER_MIN_SLEEP = 30
+SCHEDULER_MAX_SLEEP = 3600
+
+# 预编译正则，避免每次解析都走 re 模块的内部缓存查找
+_SIZE_RE = re.compile(r'([\d.]+)\s*([a-zA-Z]+)', re.IGNORECASE)
+_ZH_RANGE_RE = re.compile(r'第(\d+)[-~](\d+)集')
+_EN_RANGE_RE = re.compile(r'EP?(\d+)[-~]E?P?(\d+)', re.IGNORECASE)
+
+class _DownloadBatch:
+    """一轮调度中攒下的离线任务，按目标目录分组，结束时统一提交"""
+    def __init__(self):
+        # (to_cid, save_path_str) -> [(link, sub)]
+        self.tasks: Dict[Tuple[Optional[str], Optional[str]], List[Tuple[str, Subscription]]] = {}
+        # 提交失败时用于回滚的订阅状态: sub.id -> (current_episode, status)
+        self.rollback: Dict[str, Tuple[int, str]] = {}
+
+# 只在调度器本轮的检查任务中设置；新增订阅时的立即检查等其他调用不受影响，仍立即下载
+_download_batch: ContextVar[Optional[_DownloadBatch]] = ContextVar("download_batch", default=None)
+
+def _join(base: str, name: str) -> str:
+    """拼接网盘路径并去除多余的 '/'，结果总以 '/' 开头"""
+    return "/" + "/".join(p for p in f"{base}/{name}".split("/") if p)
+
+@lru_cache(maxsize=4096)
+def _parse_date(date_str: Optional[str]) -> Optional[date]:
+    """解析 TMDB 的 YYYY-MM-DD 日期 (同一批日期每轮都会比较，结果缓存)，无法解析时返回 None"""
+    if not date_str:
+        return None
+    try:
+        return date.fromisoformat(date_str)
+    except ValueError:
+        return None
+
+_SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024**2, 'GB': 1024**3, 'TB': 1024**4}
+
+@lru_cache(maxsize=1024)
+def _parse_size(size_str: str) -> float:
+    """解析文件大小字符串为字节数值，用于比较大小 (相同字符串大量重复出现，结果缓存)"""
+    if not size_str: return 0.0
+    try:
+        match = _SIZE_RE.search(str(size_str))
+        if not match: return 0.0
+        num = float(match.group(1))
+        unit = match.group(2).upper()
+        return num * _SIZE_UNITS.get(unit, 1)
+    except Exception:
+        return 0.0
 
 class SubscriptionService:
     def __init__(self):
-        self._ensure_data_file()
+        self._conn = self._open_db()
         self.subscriptions: List[Subscription] = self._load_data()
+        # id -> 订阅 的索引，用于 O(1) 查重；列表仍保留以维持展示顺序
+        self._by_id: Dict[str, Subscription] = {s.id: s for s in self.subscriptions}
         self.is_running = False
-
-    def _ensure_data_file(self):
-        if not os.path.exists("data"):
-            os.makedirs("data")
-        if not os.path.exists(DATA_FILE):
-            with open(DATA_FILE, "w", encoding="utf-8") as f:
-                json.dump([], f)
+        # 有改动/已删除的订阅 id，保存时只写这些行
+        self._dirty_ids: Set[str] = set()
+        self._deleted_ids: Set[str] = set()
+        # 串行化数据库写入
+        self._save_lock = asyncio.Lock()
+        # 保护订阅列表/索引的结构性修改 (增删)；遍历时使用列表快照
+        self._lock = asyncio.Lock()
+        # 新增订阅时唤醒调度器
+        self._wakeup = asyncio.Event()
+
+    def _open_db(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
+        # 所有写操作都在 _save_lock 内串行执行 (经 to_thread 进入线程)，连接可跨线程共享
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS subs (id TEXT PRIMARY KEY, json BLOB NOT NULL)")
+        self._migrate_legacy(conn)
+        return conn
+
+    def _migrate_legacy(self, conn: sqlite3.Connection):
+        """旧版本使用 JSON 文件整体保存，首次启动时导入数据库并重命名旧文件"""
+        if not os.path.exists(LEGACY_DATA_FILE):
+            return
+        if conn.execute("SELECT 1 FROM subs LIMIT 1").fetchone():
+            return
+        try:
+            with open(LEGACY_DATA_FILE, "rb") as f:
+                data = orjson.loads(f.read())
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO subs (id, json) VALUES (?, ?)",
+                    [(item["id"], orjson.dumps(item)) for item in data]
+                )
+            os.replace(LEGACY_DATA_FILE, LEGACY_DATA_FILE + ".migrated")
+            logger.info("Migrated %d subscriptions from %s", len(data), LEGACY_DATA_FILE)
+        except Exception as e:
+            logger.error("Failed to migrate %s: %s", LEGACY_DATA_FILE, e)
 
     def _load_data(self) -> List[Subscription]:
         try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return [Subscription(**item) for item in data]
-        except Exception:
+            # 按插入顺序逐行读取；数据由本服务写入，可信，跳过校验直接构造
+            subs = [
+                Subscription.model_construct(**orjson.loads(row[0]))
+                for row in self._conn.execute("SELECT json FROM subs ORDER BY rowid")
+            ]
+        except Exception as e:
+            logger.error("Failed to load subscriptions: %s", e)
             return []
+        # 加载时解析一次 next_check_time，之后调度只比较时间戳
+        for sub in subs:
+            if sub.next_check_time:
+                try:
+                    sub._next_check_ts = datetime.strptime(sub.next_check_time, TIME_FMT).timestamp()
+                except ValueError as e:
+                    logger.error("Date parse failed for %s: %s", sub.title, e)
+        return subs
 
-    def _save_data(self):
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump([s.dict() for s in self.subscriptions], f, ensure_ascii=False, indent=2)
+    def _mark_dirty(self, *subs: Subscription):
+        self._dirty_ids.update(sub.id for sub in subs)
 
-    def _parse_size(self, size_str: str) -> float:
-        """解析文件大小字符串为字节数值，用于比较大小"""
-        if not size_str: return 0.0
+    async def _save_data(self):
+        """只写入有改动的订阅行，删除已移除的订阅；写入失败时记录日志并保留改动，下次保存时重试"""
+        if not self._dirty_ids and not self._deleted_ids:
+            return
+        # 在事件循环中序列化改动的订阅，数据库写入放到线程中执行，避免阻塞事件循环
+        rows = [
+            (sub_id, orjson.dumps(sub.model_dump()))
+            for sub_id in self._dirty_ids
+            if (sub := self._by_id.get(sub_id)) is not None
+        ]
+        deleted = [(sub_id,) for sub_id in self._deleted_ids]
+        dirty_ids, deleted_ids = self._dirty_ids, self._deleted_ids
+        self._dirty_ids, self._deleted_ids = set(), set()
         try:
-            match = re.search(r'([\d.]+)\s*([a-zA-Z]+)', str(size_str), re.IGNORECASE)
-            if not match: return 0.0
-            num = float(match.group(1))
-            unit = match.group(2).upper()
-            units = {'B': 1, 'KB': 1024, 'MB': 1024**2, 'GB': 1024**3, 'TB': 1024**4}
-            return num * units.get(unit, 1)
-        except Exception:
-            return 0.0
+            async with self._save_lock:
+                await asyncio.to_thread(self._write_rows, rows, deleted)
+        except Exception as e:
+            # 写入失败：内存中的改动已生效，只记录日志，把本次的改动放回去，下次保存时重试
+            # (期间被重新删除/修改的订阅以最新状态为准)
+            logger.error("Failed to save subscriptions, will retry on next save: %s", e)
+            self._dirty_ids |= dirty_ids - self._deleted_ids
+            self._deleted_ids |= deleted_ids - self._dirty_ids
+
+    def _write_rows(self, rows: List[Tuple[str, bytes]], deleted: List[Tuple[str]]):
+        with self._conn:
+            # UPSERT 保留原 rowid，维持订阅的展示顺序
+            self._conn.executemany(
+                "INSERT INTO subs (id, json) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET json = excluded.json",
+                rows
+            )
+            self._conn.executemany("DELETE FROM subs WHERE id = ?", deleted)
 
     def _extract_max_episode(self, filename: str, default_ep: int) -> int:
         """
@@ -59,16 +181,14 @@ class SubscriptionService:
         - "...EP14..." -> 返回 14 (或 default_ep)
         """
         try:
-            name = filename.upper()
-            
             # 模式1: 中文范围 [第13-16集]
-            zh_range = re.search(r'第(\d+)[-~](\d+)集', name)
+            zh_range = _ZH_RANGE_RE.search(filename)
             if zh_range:
                 end = int(zh_range.group(2))
                 return max(end, default_ep)
 
             # 模式2: 英文范围 E13-E16, E13-16, EP13-16
-            en_range = re.search(r'[E|EP](\d+)[-~][E|EP]?(\d+)', name)
+            en_range = _EN_RANGE_RE.search(filename)
             if en_range:
                 end = int(en_range.group(2))
                 # 简单过滤：如果解析出特别大的数字(比如年份2026)，忽略
@@ -85,9 +205,8 @@ class SubscriptionService:
         if req.media_type == 'tv':
             sub_id += f"_s{req.season_number}"
 
-        for sub in self.subscriptions:
-            if sub.id == sub_id:
-                return {"success": False, "message": "已在订阅列表中"}
+        if sub_id in self._by_id:
+            return {"success": False, "message": "已在订阅列表中"}
 
         new_sub = Subscription(
             id=sub_id,
@@ -95,25 +214,25 @@ class SubscriptionService:
             media_type=req.media_type,
             title=req.title,
             poster_path=req.poster_path,
-            next_check_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         )
+        self._set_next_check(new_sub)
 
         try:
             # 1. 初始化元数据并确定年份
             year_str = ""
             
             if req.media_type == 'movie':
-                details = await asyncio.to_thread(tmdb_service.get_details_full, 'movie', req.tmdb_id)
+                details = await tmdb_service.get_details_full('movie', req.tmdb_id, include=DETAILS_BASIC)
                 new_sub.release_date = details.release_date
                 new_sub.message = f"等待上映 ({new_sub.release_date})"
                 if details.release_date:
                     year_str = details.release_date.split('-')[0]
             else:
                 new_sub.season_number = req.season_number
-                season_info = await asyncio.to_thread(tmdb_service.get_season_details, req.tmdb_id, req.season_number)
+                season_info = await tmdb_service.get_season_details(req.tmdb_id, req.season_number)
                 new_sub.total_episodes = season_info.episode_count
                 
-                show_details = await asyncio.to_thread(tmdb_service.get_details_full, 'tv', req.tmdb_id)
+                show_details = await tmdb_service.get_details_full('tv', req.tmdb_id, include=DETAILS_BASIC)
                 if show_details.release_date:
                     year_str = show_details.release_date.split('-')[0]
                 
@@ -129,21 +248,32 @@ class SubscriptionService:
             folder_name = f"{req.title} ({year_str}) {{tmdbid-{req.tmdb_id}}}" if year_str else f"{req.title} {{tmdbid-{req.tmdb_id}}}"
             
             base_path = settings.P115_DOWNLOAD_PATH or ""
-            target_path = f"{base_path}/{folder_name}".replace("//", "/")
+            target_path = _join(base_path, folder_name)
+            if req.media_type == 'tv':
+                # 剧集通知 MoviePilot 扫描整个剧集文件夹，这样它能处理新增加的集数
+                new_sub.save_path = _join(base_path, req.title)
             
             try:
-                cid = await asyncio.to_thread(p115_service.get_target_cid, target_path)
+                cid = await p115_service.get_target_cid(target_path)
                 new_sub.save_cid = str(cid)
-                print(f"Created/Resolved folder for {req.title}: {folder_name} (CID {cid})")
+                logger.info("Created/Resolved folder for %s: %s (CID %s)", req.title, folder_name, cid)
             except Exception as e:
-                print(f"Failed to create folder for {req.title}: {e}")
+                logger.error("Failed to create folder for %s: %s", req.title, e)
                 new_sub.message += " (注意: 文件夹创建失败，使用默认目录)"
 
         except Exception as e:
             return {"success": False, "message": f"初始化失败: {str(e)}"}
 
-        self.subscriptions.append(new_sub)
-        self._save_data()
+        async with self._lock:
+            # 初始化期间可能有相同订阅被并发添加，再检查一次
+            if sub_id in self._by_id:
+                return {"success": False, "message": "已在订阅列表中"}
+            self.subscriptions.append(new_sub)
+            self._by_id[sub_id] = new_sub
+        # 删除后立即重新添加 (且删除尚未写入成功) 时，撤销待删除，避免同一次保存中先写入再删除
+        self._deleted_ids.discard(sub_id)
+        self._mark_dirty(new_sub)
+        await self._save_data()
 
         # 立即触发检查
         try:
@@ -151,15 +281,23 @@ class SubscriptionService:
                 await self._process_movie(new_sub)
             else:
                 await self._process_tv(new_sub)
-            self._save_data()
+            self._mark_dirty(new_sub)
+            await self._save_data()
         except Exception:
             pass
+        self._wakeup.set()
 
         return {"success": True, "message": "订阅成功，后台已开始搜索资源"}
 
-    def delete_subscription(self, sub_id: str):
-        self.subscriptions = [s for s in self.subscriptions if s.id != sub_id]
-        self._save_data()
+    async def delete_subscription(self, sub_id: str):
+        async with self._lock:
+            removed = self._by_id.pop(sub_id, None) is not None
+            if removed:
+                self.subscriptions = [s for s in self.subscriptions if s.id != sub_id]
+        if removed:
+            self._dirty_ids.discard(sub_id)
+            self._deleted_ids.add(sub_id)
+            await self._save_data()
         return {"success": True, "message": "删除成功"}
 
     def get_list(self):
@@ -169,70 +307,87 @@ class SubscriptionService:
     async def start_scheduler(self):
         if self.is_running: return
         self.is_running = True
-        print("Starting Subscription Scheduler...")
+        logger.info("Starting Subscription Scheduler...")
         while True:
+            # 先清除再检查：检查期间新增订阅发出的唤醒会保留到下面的等待，不会丢失
+            self._wakeup.clear()
             try:
                 await self.check_all_subscriptions()
             except Exception as e:
-                print(f"Scheduler Error: {e}")
-            await asyncio.sleep(3600)
+                logger.exception("Scheduler Error: %s", e)
+            # 睡到最早一个订阅到期为止；新增订阅会提前唤醒，重新计算下次唤醒时间
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._seconds_until_next_check())
+
+    def _seconds_until_next_check(self) -> float:
+        now_ts = time.time()
+        next_ts = min(
+            (sub._next_check_ts for sub in self.subscriptions if sub.status != 'completed'),
+            default=now_ts + SCHEDULER_MAX_SLEEP
+        )
+        return min(SCHEDULER_MAX_SLEEP, max(SCHEDULER_MIN_SLEEP, next_ts - now_ts))
 
     async def check_all_subscriptions(self):
         now = datetime.now()
-        updated = False
-        print(f"[Scheduler] Waking up at {now.strftime('%H:%M:%S')}, checking {len(self.subscriptions)} subscriptions...")
-
-        for sub in self.subscriptions:
-            if sub.status == 'completed': continue
-            
-            if sub.next_check_time:
-                try:
-                    check_time = datetime.strptime(sub.next_check_time, "%Y-%m-%d %H:%M:%S")
-                    if now < check_time:
-                        print(f"  - [Skip] {sub.title}: Wait until {sub.next_check_time}")
-                        continue
-                except Exception as e:
-                    print(f"  - [Error] Date parse failed for {sub.title}: {e}")
-                    pass
+        now_ts = now.timestamp()
+        today = now.date()
+        logger.info("[Scheduler] Waking up, checking %d subscriptions...", len(self.subscriptions))
+
+        # 先筛出已到期的订阅 (同时得到一份快照，检查期间的增删不会影响本轮迭代)
+        due = [sub for sub in self.subscriptions if sub.status != 'completed' and sub._next_check_ts <= now_ts]
+        logger.debug("[Scheduler] %d subscriptions due", len(due))
+
+        # 各订阅互不依赖，并发检查；信号量限制同时进行的订阅数，避免瞬间打满上游接口
+        sem = asyncio.Semaphore(settings.SUB_CONCURRENCY)
+        last_check_time = now.strftime(TIME_FMT)
+        # 本轮产生的离线任务先攒起来，结束后按目标目录合并提交 (gather 创建的任务继承该上下文)
+        batch = _DownloadBatch()
+        token = _download_batch.set(batch)
+        try:
+            await asyncio.gather(*[self._check_one(sub, sem, today, last_check_time) for sub in due])
+        finally:
+            _download_batch.reset(token)
+            await self._flush_downloads(batch)
+        
+        if due:
+            self._mark_dirty(*due)
+            await self._save_data()
+            logger.info("[Scheduler] Data saved.")
+        else:
+            logger.info("[Scheduler] No changes needed.")
 
-            print(f"  > [Run] Checking updates for: {sub.title} ({sub.media_type})")
+    async def _check_one(self, sub: Subscription, sem: asyncio.Semaphore, today: date, last_check_time: str):
+        async with sem:
+            logger.info("  > [Run] Checking updates for: %s (%s)", sub.title, sub.media_type)
 
             try:
                 if sub.media_type == 'movie':
-                    await self._process_movie(sub)
+                    await self._process_movie(sub, today)
                 else:
-                    await self._process_tv(sub)
+                    await self._process_tv(sub, today)
                 
-                updated = True
-                sub.last_check_time = now.strftime("%Y-%m-%d %H:%M:%S")
+                sub.last_check_time = last_check_time
                 
             except Exception as e:
-                print(f"Error checking {sub.title}: {e}")
+                logger.error("Error checking %s: %s", sub.title, e)
                 sub.message = f"检查出错: {str(e)}"
-                sub.next_check_time = (now + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
-                updated = True
-        
-        if updated:
-            self._save_data()
-            print("[Scheduler] Data saved.")
-        else:
-            print("[Scheduler] No changes needed.")
+                self._set_next_check(sub, timedelta(hours=1))
 
-    async def _process_movie(self, sub: Subscription):
-        today_str = datetime.now().strftime("%Y-%m-%d")
-        if sub.release_date and sub.release_date > today_str:
+    async def _process_movie(self, sub: Subscription, today: Optional[date] = None):
+        today = today or date.today()
+        release_date = _parse_date(sub.release_date)
+        if release_date and release_date > today:
             sub.message = f"尚未上映，等待 {sub.release_date}"
-            sub.next_check_time = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+            self._set_next_check(sub, timedelta(days=1))
             return
 
-        resources = await asyncio.to_thread(nullbr_service.fetch_movie, sub.tmdb_id)
+        resources = await nullbr_service.fetch_movie(sub.tmdb_id)
         valid_res = [r for r in resources if r.link and r.link_type in ['magnet', 'ed2k']]
         
         if valid_res:
-            valid_res.sort(key=lambda x: self._parse_size(x.size), reverse=True)
-            target = valid_res[0]
+            target = max(valid_res, key=lambda x: _parse_size(x.size or ""))
             movie_path = settings.P115_DOWNLOAD_PATH
-            success = await self._perform_download(target, to_cid=sub.save_cid, save_path_str=movie_path)
+            success = await self._perform_download(target, sub, to_cid=sub.save_cid, save_path_str=movie_path)
 
             if success:
                 sub.status = 'completed'
@@ -242,16 +397,17 @@ class SubscriptionService:
         else:
             self._defer_check(sub, hours=8, msg="暂无磁力/Ed2k资源")
 
-    async def _process_tv(self, sub: Subscription):
+    async def _process_tv(self, sub: Subscription, today: Optional[date] = None):
+        today = today or date.today()
         # [修改] 使用循环，一次性追完所有可用集数
         max_loops = 50 # 防止死循环的安全阈值
         loops = 0
 
-        # 逻辑必须与 add_subscription 中的 target_path 逻辑一致
-        base_path = settings.P115_DOWNLOAD_PATH or ""
-        # 剧集路径通常为: 基础下载路径/剧集标题
-        # 注意：这里我们通知 MoviePilot 扫描整个剧集文件夹，这样它能处理新增加的集数
-        tv_show_path = f"{base_path}/{sub.title}".replace("//", "/")
+        # 剧集路径通常为: 基础下载路径/剧集标题 (旧订阅没有 save_path 时现算)
+        tv_show_path = sub.save_path or _join(settings.P115_DOWNLOAD_PATH or "", sub.title)
+
+        # 追更时预取接下来已播出的几集，并发请求；若中途遇到打包资源，多取的结果直接丢弃
+        prefetched = await self._prefetch_episodes(sub, today)
 
         while loops < max_loops:
             loops += 1
@@ -264,28 +420,27 @@ class SubscriptionService:
                 break # 退出循环
 
             # 2. 检查上映时间
-            today_str = datetime.now().strftime("%Y-%m-%d")
             air_date = sub.episode_air_dates.get(str(target_ep))
             
-            if air_date and air_date > today_str:
+            air_day = _parse_date(air_date)
+            if air_day and air_day > today:
                 sub.message = f"等待第 {target_ep} 集上映 ({air_date})"
-                sub.next_check_time = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+                self._set_next_check(sub, timedelta(days=1))
                 break # 暂时无新集，退出循环，下次调度再查
 
-            print(f"Fetching TV Resource: {sub.title} S{sub.season_number}E{target_ep}...")
+            logger.info("Fetching TV Resource: %s S%sE%s...", sub.title, sub.season_number, target_ep)
             
             # 3. 获取资源
-            resources = await asyncio.to_thread(
-                nullbr_service.fetch_tv_episode, sub.tmdb_id, sub.season_number, target_ep
-            )
+            resources = prefetched.pop(target_ep, None)
+            if resources is None:
+                resources = await nullbr_service.fetch_tv_episode(sub.tmdb_id, sub.season_number, target_ep)
             valid_res = [r for r in resources if r.link and r.link_type in ['magnet', 'ed2k']]
 
             if valid_res:
-                # 排序
-                valid_res.sort(key=lambda x: self._parse_size(x.size), reverse=True)
-                target = valid_res[0]
+                # 取体积最大的资源 (只需最大值，无需完整排序)
+                target = max(valid_res, key=lambda x: _parse_size(x.size or ""))
 
-                success = await self._perform_download(target, to_cid=sub.save_cid, save_path_str=tv_show_path)
+                success = await self._perform_download(target, sub, to_cid=sub.save_cid, save_path_str=tv_show_path)
                 
                 if success:
                     # [关键修改] 解析文件名，检测是否为打包资源
@@ -293,17 +448,15 @@ class SubscriptionService:
                     
                     # 确保集数是向前推进的
                     if new_current > target_ep:
-                        print(f"Pack Detected: {target.title} covers up to {new_current}")
+                        logger.info("Pack Detected: %s covers up to %s", target.title, new_current)
                         sub.current_episode = new_current
                         sub.message = f"已添加打包资源 ({target_ep}-{new_current})，继续搜索下一集"
                     else:
                         sub.current_episode = target_ep
                         sub.message = f"已添加第 {target_ep} 集 ({target.size})"
 
-                    sub.next_check_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    self._set_next_check(sub)
                     
-                    # 稍微等待避免请求过快
-                    await asyncio.sleep(2) 
                     # 成功后 CONTINUE，继续下一轮循环，搜索下一集
                     continue 
                 else:
@@ -313,21 +466,73 @@ class SubscriptionService:
                 self._defer_check(sub, hours=8, msg=f"第 {target_ep} 集暂无资源")
                 break # 没资源，暂停追更
 
+    async def _prefetch_episodes(self, sub: Subscription, today: date) -> Dict[int, list]:
+        """并发获取 current_episode 之后已确定播出的 PREFETCH_EPISODES 集，失败的集数留给主循环重试"""
+        first = sub.current_episode + 1
+        last = first + PREFETCH_EPISODES - 1
+        if sub.total_episodes > 0:
+            last = min(last, sub.total_episodes)
+        episodes = []
+        for ep in range(first, last + 1):
+            air_date = _parse_date(sub.episode_air_dates.get(str(ep)))
+            if not air_date or air_date > today:
+                break
+            episodes.append(ep)
+        if len(episodes) < 2:
+            return {}
+        results = await asyncio.gather(*[
+            nullbr_service.fetch_tv_episode(sub.tmdb_id, sub.season_number, ep) for ep in episodes
+        ], return_exceptions=True)
+        return {ep: r for ep, r in zip(episodes, results) if not isinstance(r, BaseException)}
+
     def _defer_check(self, sub: Subscription, hours: int, msg: str):
         sub.message = msg
-        sub.next_check_time = (datetime.now() + timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+        self._set_next_check(sub, timedelta(hours=hours))
 
-    async def _perform_download(self, resource, to_cid: Optional[str] = None, save_path_str: Optional[str] = None) -> bool:
-        """执行离线下载"""
+    def _set_next_check(self, sub: Subscription, delay: timedelta = timedelta(0)):
+        """同时更新展示用的 next_check_time 与调度用的时间戳"""
+        next_time = datetime.now() + delay
+        sub.next_check_time = next_time.strftime(TIME_FMT)
+        sub._next_check_ts = next_time.timestamp()
+
+    async def _perform_download(self, resource, sub: Subscription, to_cid: Optional[str] = None, save_path_str: Optional[str] = None) -> bool:
+        """
+        执行离线下载。
+        调度期间只加入批次并乐观地返回成功，由 _flush_downloads 统一提交，失败时回滚订阅状态。
+        """
         try:
             if resource.link_type not in ['magnet', 'ed2k']:
                 return False
-            res = await asyncio.to_thread(
-                p115_service.add_offline_tasks, [resource.link], to_cid=to_cid, save_path_str=save_path_str
-            )
+            batch = _download_batch.get()
+            if batch is not None:
+                batch.rollback.setdefault(sub.id, (sub.current_episode, sub.status))
+                batch.tasks.setdefault((to_cid, save_path_str), []).append((resource.link, sub))
+                return True
+            res = await p115_service.add_offline_tasks([resource.link], to_cid=to_cid, save_path_str=save_path_str)
             return res.get('success', False)
         except Exception as e:
-            print(f"Download failed: {e}")
+            logger.error("Download failed: %s", e)
             return False
 
+    async def _flush_downloads(self, batch: _DownloadBatch):
+        """每个目标目录只提交一次离线任务；提交失败的订阅恢复到本轮之前的进度，稍后重试"""
+        async def submit(to_cid, save_path_str, entries):
+            links = [link for link, _ in entries]
+            try:
+                res = await p115_service.add_offline_tasks(links, to_cid=to_cid, save_path_str=save_path_str)
+                success = res.get('success', False)
+            except Exception as e:
+                logger.error("Download failed: %s", e)
+                success = False
+            if success:
+                return
+            failed = list({sub.id: sub for _, sub in entries}.values())
+            for sub in failed:
+                sub.current_episode, sub.status = batch.rollback[sub.id]
+                self._defer_check(sub, hours=8, msg="下载任务添加失败，稍后重试")
+            # 回滚后的状态同样需要写回数据库
+            self._mark_dirty(*failed)
+
+        await asyncio.gather(*[submit(cid, path, entries) for (cid, path), entries in batch.tasks.items()])
+
 subscription_service = SubscriptionService()
\ No newline at end of file
@@ -1,203 +1,387 @@
-from tmdbv3api import TMDb, Movie, TV, Search, Discover, Genre as TMDBGenre, Season as TMDBSeason, Trending
 from app.core.config import settings
 from app.models.schemas import (
     MediaMeta, MediaDetail, SearchResult, 
     Person, Genre, Season, Episode
 )
-from typing import Optional, List, Any
+from app.services.tmdb_cache import tmdb_cache, make_key
+from app.core.singleflight import SingleFlight
+from app.core.cache_status import mark_stale, track_stale
+from typing import Optional, List, Dict, Set, Any, Callable, Iterable, Union
+from cachetools import TTLCache
+from cachetools.keys import hashkey
+from functools import wraps
+import asyncio
+import httpx
+import logging
+import orjson
 import os
+import time
+
+logger = logging.getLogger(__name__)
+
+TMDB_API_BASE = "https://api.themoviedb.org/3"
+# 图片地址前缀：解析时直接拼接，无需逐个字段调用格式化函数
+_IMG_W500 = "https://image.tmdb.org/t/p/w500"
+_IMG_ORIG = "https://image.tmdb.org/t/p/original"
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# 被 TMDB 限流 (429) 时的重试次数与单次最长等待秒数
+RATE_LIMIT_RETRIES = 2
+RATE_LIMIT_MAX_WAIT = 10
+
+# 热门内容预热间隔；搜索后预取详情的结果条数
+WARM_INTERVAL = 6 * HOUR
+SEARCH_WARM_COUNT = 5
+
+# get_details_full 的 include：详情页需要全部附加数据；只用到日期/标题等字段时不请求附加数据
+DETAILS_FULL = frozenset({"credits", "recommendations", "similar"})
+DETAILS_BASIC = frozenset()
+
+# 仍在更新的剧集，详情变化较快
+_AIRING_STATUSES = ("Returning Series", "In Production", "Planned", "Pilot")
+# 已完结/已取消的剧集基本不会再变化
+_ENDED_TV_STATUSES = ("Ended", "Canceled")
+
+def _details_ttl(data: Dict[str, Any]) -> int:
+    """连载中的剧集缓存 1 天；已完结剧集缓存 30 天；电影等其余情况缓存 7 天"""
+    status = data.get('status')
+    if status in _AIRING_STATUSES:
+        return DAY
+    if status in _ENDED_TV_STATUSES:
+        return 30 * DAY
+    return 7 * DAY
+
+def _append_str(include: frozenset) -> str:
+    return ",".join(sorted(include))
+
+def _memoized(cache: Callable[[Any], TTLCache], kind: Optional[str] = None):
+    """
+    进程内 TTL 缓存 (协程版 cachedmethod)，key 为 (kind, 参数...)，忽略 self。
+    缓存只在事件循环线程中读写，无需加锁；未命中期间相同 key 的并发调用只执行一次。
+    结果中含有过期数据时不缓存
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            store = cache(self)
+            key = hashkey(kind, *args, **kwargs)
+            try:
+                return store[key]
+            except KeyError:
+                pass
+
+            async def load():
+                result, stale = await track_stale(lambda: func(self, *args, **kwargs))
+                # 过期数据 (后台刷新中或上游故障时的兜底) 不进入进程内缓存，之后的调用仍会读到刷新后的持久化缓存
+                if not stale:
+                    store[key] = result
+                return result, stale
+
+            result, stale = await self._flight.do(key, load)
+            if stale:
+                # 每个调用者 (包括合并到同一次加载的) 都标记自己的请求
+                mark_stale()
+            return result
+        return wrapper
+    return decorator
 
 class TMDBService:
     def __init__(self):
+        # 进程级代理：Nullbr 等基于 requests 的 SDK 通过环境变量读取；TMDB 客户端在下面显式指定
         if settings.PROXY_URL:
             os.environ["HTTP_PROXY"] = settings.PROXY_URL
             os.environ["HTTPS_PROXY"] = settings.PROXY_URL
 
-        self.tmdb = TMDb()
-        self.tmdb.api_key = settings.TMDB_API_KEY
-        self.tmdb.language = settings.TMDB_LANGUAGE
-        self.tmdb.debug = False
-        
-        self.movie_api = Movie()
-        self.tv_api = TV()
-        self.search_api = Search()
-        self.discover_api = Discover()
-        self.genre_api = TMDBGenre()
-        self.season_api = TMDBSeason()
-        self.trending_api = Trending()
-
-    def _ensure_list(self, obj: Any) -> List:
-        """强制转为 List"""
-        if obj is None:
-            return []
-        if isinstance(obj, list):
-            return obj
+        # 直接请求 TMDB API：单个长连接池 (HTTP/2 多路复用)，响应按原始 JSON (dict) 解析
+        self.client = httpx.AsyncClient(
+            base_url=TMDB_API_BASE,
+            http2=True,
+            params={"api_key": settings.TMDB_API_KEY, "language": settings.TMDB_LANGUAGE},
+            proxy=settings.PROXY_URL or None,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
+        )
+
+        # 信号量限制同时发往 TMDB 的请求数
+        self._sem = asyncio.Semaphore(settings.TMDB_MAX_CONCURRENCY)
+
+        # 进程内 TTL 缓存 (SQLite 持久化缓存之前的第一层)：类型列表几乎不变，发现/搜索结果短时间内可复用
+        self._genre_cache = TTLCache(maxsize=256, ttl=DAY)
+        self._list_cache = TTLCache(maxsize=4096, ttl=600)
+        # 详情/季信息：订阅与详情页反复查询同一部作品。返回的是共享对象，调用方修改前需先复制
+        self._detail_cache = TTLCache(maxsize=1024, ttl=3600)
+        # 合并相同的并发请求：进程内缓存未命中 (key 为元组) 与 TMDB 拉取 (key 为持久化缓存 key) 共用
+        self._flight = SingleFlight()
+        # 预热等后台任务的引用
+        self._background: Set[asyncio.Task] = set()
+        # 正在后台刷新的持久化缓存 key -> 任务，避免同一条目被重复刷新 (同时持有任务引用，防止被回收)
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def _request(self, path: str, params: Dict[str, Any]) -> bytes:
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            async with self._sem:
+                resp = await self.client.get(path, params=params)
+            if resp.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                break
+            # 触发 TMDB 限流：按 Retry-After 等待后重试 (等待期间不占用信号量)
+            try:
+                delay = float(resp.headers.get("Retry-After", 1))
+            except ValueError:
+                delay = 1.0
+            logger.warning("TMDB rate limit reached, retrying %s in %.1fs", path, delay)
+            await asyncio.sleep(min(delay, RATE_LIMIT_MAX_WAIT))
+        if resp.is_error:
+            # 不使用 raise_for_status：其错误信息包含完整 URL (带 api_key)，会被写入日志或返回给前端
+            raise httpx.HTTPStatusError(f"TMDB {path} returned {resp.status_code}", request=resp.request, response=resp)
+        return resp.content
+
+    async def _get(self, path: str, **params) -> Dict[str, Any]:
+        return orjson.loads(await self._request(path, params))
+
+    async def _get_cached(self, kind: str, path: str, ttl: Union[int, Callable[[Dict[str, Any]], int]],
+                          stale_grace: int = 0, **params) -> Dict[str, Any]:
+        """
+        带持久化缓存 (SQLite) 的 _get，位于进程内 TTL 缓存之后、TMDB 请求之前。
+        缓存 TMDB 返回的原始 JSON 字节，写入无需再序列化，解析逻辑变化后旧缓存依然可用。
+        ttl 可以是秒数，或根据响应计算秒数的函数。
+        stale_grace > 0 时启用 stale-while-revalidate：过期不超过 stale_grace 秒的条目直接返回，同时在后台刷新。
+        TMDB 请求失败 (故障/限流) 时，只要保留期内还有旧数据就返回旧数据而不是报错。
+        """
+        key = self._cache_key(kind, path, params)
+        cached, overdue = await self._read_cache(key)
+
+        if cached is not None:
+            if overdue < 0:
+                return cached
+            if overdue < stale_grace:
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(
+                        self._refresh(key, path, params, ttl), name=f"tmdb-refresh-{kind}"
+                    )
+                mark_stale()
+                return cached
+
         try:
-            return list(obj)
-        except TypeError:
-            return []
+            return await self._load(key, path, params, ttl)
+        except Exception as e:
+            if cached is None:
+                raise
+            logger.warning("TMDB request failed, serving stale %s: %s", key, e)
+            mark_stale()
+            return cached
 
-    def _get_attr(self, obj: Any, key: str, default: Any = None) -> Any:
-        """安全获取属性"""
-        if hasattr(obj, key):
-            val = getattr(obj, key)
-            return val if val is not None else default
-        if isinstance(obj, dict):
-            return obj.get(key, default)
-        return default
-
-    def _get_image_url(self, path, size="w500"):
-        return f"https://image.tmdb.org/t/p/{size}{path}" if path else None
-
-    def _parse_basic(self, item, media_type_override=None) -> MediaMeta:
-        m_type = self._get_attr(item, 'media_type', media_type_override)
-        if not m_type:
-            if hasattr(item, 'title'): m_type = 'movie' 
-            elif hasattr(item, 'name'): m_type = 'tv'
-            else: m_type = 'movie'
-
-        title = self._get_attr(item, 'title', self._get_attr(item, 'name', 'Unknown'))
-        orig_title = self._get_attr(item, 'original_title', self._get_attr(item, 'original_name', 'Unknown'))
-        date = self._get_attr(item, 'release_date', self._get_attr(item, 'first_air_date', ''))
-        
-        g_ids = self._ensure_list(self._get_attr(item, 'genre_ids', []))
+    @staticmethod
+    def _cache_key(kind: str, path: str, params: Dict[str, Any]) -> str:
+        return make_key(kind, path, sorted(params.items()), settings.TMDB_LANGUAGE)
 
-        tmdb_id_val = self._get_attr(item, 'id', 0)
+    async def _read_cache(self, key: str):
+        """读取持久化缓存，返回 (数据, 已过期秒数)，无缓存时数据为 None"""
+        # SQLite 读写放到线程中执行，避免阻塞事件循环
+        entry = await asyncio.to_thread(tmdb_cache.get, key)
+        if entry is not None:
+            payload, expires_at = entry
+            try:
+                return orjson.loads(payload), time.time() - expires_at
+            except orjson.JSONDecodeError as e:
+                logger.warning("Discarding unreadable cache entry %s: %s", key, e)
+        return None, 0.0
+
+    async def _load(self, key: str, path: str, params: Dict[str, Any], ttl) -> Dict[str, Any]:
+        """
+        从 TMDB 拉取并写入持久化缓存。按缓存 key 合并并发请求：
+        前台冷加载、后台刷新与预热命中同一条目时只发出一次 TMDB 请求
+        """
+        async def fetch():
+            payload = await self._request(path, params)
+            data = orjson.loads(payload)
+            await asyncio.to_thread(tmdb_cache.put, key, payload, ttl(data) if callable(ttl) else ttl)
+            return data
+        return await self._flight.do(key, fetch)
 
-        return MediaMeta(
-            tmdb_id=tmdb_id_val,
-            title=title,
-            original_title=orig_title,
+    async def _refresh(self, key: str, path: str, params: Dict[str, Any], ttl):
+        try:
+            await self._load(key, path, params, ttl)
+        except Exception as e:
+            logger.warning("Background refresh of %s failed: %s", key, e)
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def aclose(self):
+        """取消预热/预取、后台刷新及进行中的请求，等它们结束后再关闭连接池"""
+        tasks = [*self._background, *self._refreshing.values()]
+        for task in tasks:
+            task.cancel()
+        # 后台刷新经 SingleFlight (shield) 发出的请求不会随刷新任务一起取消，单独取消
+        tasks += self._flight.cancel_all()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.client.aclose()
+
+    def _spawn(self, coro, name: str):
+        """启动后台任务并保留引用，防止任务执行中被回收"""
+        task = asyncio.create_task(coro, name=name)
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Background task %s failed: %s", task.get_name(), task.exception())
+
+    async def _warm_details(self, items: List[MediaMeta]):
+        for media_type in ('movie', 'tv'):
+            ids = [m.tmdb_id for m in items if m.media_type == media_type]
+            if ids:
+                await self.get_details_batch(media_type, ids)
+
+    async def warm_popular(self):
+        """预热热门电影/剧集 (发现页前 TMDB_WARM_PAGES 页) 的详情缓存"""
+        for media_type in ('movie', 'tv'):
+            pages = await asyncio.gather(
+                *[self.discover_media(media_type, page=page, prefetch=False)
+                  for page in range(1, settings.TMDB_WARM_PAGES + 1)],
+                return_exceptions=True
+            )
+            ids = list(dict.fromkeys(
+                m.tmdb_id for res in pages if not isinstance(res, BaseException) for m in res.results
+            ))
+            details = await self.get_details_batch(media_type, ids)
+            logger.info("Warmed %d/%d popular %s details", len(details), len(ids), media_type)
+
+    async def start_warmer(self):
+        """后台定时预热热门内容，首个真实用户打开热门作品时也能直接命中缓存"""
+        if settings.TMDB_WARM_PAGES <= 0:
+            return
+        while True:
+            try:
+                await self.warm_popular()
+            except Exception as e:
+                logger.exception("TMDB warm-up failed: %s", e)
+            await asyncio.sleep(WARM_INTERVAL)
+
+    # 以下解析均使用 model_construct：TMDB 返回的数据可信，跳过逐字段校验，校验只保留在 API 边界 (response_model)
+    def _parse_basic(self, item: Dict[str, Any], media_type_override=None) -> MediaMeta:
+        # 电影使用 title/release_date，剧集使用 name/first_air_date
+        m_type = item.get('media_type') or media_type_override or ('movie' if 'title' in item else 'tv' if 'name' in item else 'movie')
+
+        return MediaMeta.model_construct(
+            tmdb_id=item.get('id') or 0,
+            title=item.get('title') or item.get('name') or 'Unknown',
+            original_title=item.get('original_title') or item.get('original_name') or 'Unknown',
             media_type=m_type,
-            release_date=date,
-            poster_path=self._get_image_url(self._get_attr(item, 'poster_path')),
-            backdrop_path=self._get_image_url(self._get_attr(item, 'backdrop_path'), "original"),
-            overview=self._get_attr(item, 'overview', ''),
-            vote_average=self._get_attr(item, 'vote_average', 0.0),
-            genre_ids=g_ids
+            release_date=item.get('release_date') or item.get('first_air_date') or '',
+            poster_path=(_IMG_W500 + p) if (p := item.get('poster_path')) else None,
+            backdrop_path=(_IMG_ORIG + p) if (p := item.get('backdrop_path')) else None,
+            overview=item.get('overview') or '',
+            vote_average=item.get('vote_average') or 0.0,
+            genre_ids=item.get('genre_ids') or []
         )
 
-    def _parse_credits(self, credits_obj):
-        cast = []
-        directors = []
-        
-        raw_cast = self._get_attr(credits_obj, 'cast')
-        safe_cast = self._ensure_list(raw_cast)
-        
-        for c in safe_cast[:15]:
-            cast.append(Person(
-                id=self._get_attr(c, 'id'),
-                name=self._get_attr(c, 'name'),
-                character=self._get_attr(c, 'character'),
-                profile_path=self._get_image_url(self._get_attr(c, 'profile_path'))
-            ))
-        
-        raw_crew = self._get_attr(credits_obj, 'crew')
-        safe_crew = self._ensure_list(raw_crew)
-
-        for c in safe_crew:
-            if self._get_attr(c, 'job') == 'Director':
-                directors.append(Person(
-                    id=self._get_attr(c, 'id'),
-                    name=self._get_attr(c, 'name'),
-                    job='Director',
-                    profile_path=self._get_image_url(self._get_attr(c, 'profile_path'))
-                ))
+    def _parse_credits(self, credits_obj: Dict[str, Any]):
+        cast = [
+            Person.model_construct(
+                id=c.get('id'),
+                name=c.get('name'),
+                character=c.get('character'),
+                profile_path=(_IMG_W500 + p) if (p := c.get('profile_path')) else None
+            )
+            for c in (credits_obj.get('cast') or [])[:15]
+        ]
+        directors = [
+            Person.model_construct(
+                id=c.get('id'),
+                name=c.get('name'),
+                job='Director',
+                profile_path=(_IMG_W500 + p) if (p := c.get('profile_path')) else None
+            )
+            for c in credits_obj.get('crew') or []
+            if c.get('job') == 'Director'
+        ]
         return directors, cast
 
-    def get_trending(self, media_type: str, time_window: str = "day") -> List[MediaMeta]:
+    async def get_trending(self, media_type: str, time_window: str = "day") -> List[MediaMeta]:
         """
         获取趋势列表
         :param media_type: 'movie', 'tv', or 'all'
         :param time_window: 'day' or 'week'
         """
-        results = []
         try:
-            if media_type == 'movie':
-                if time_window == 'week':
-                    results = self.trending_api.movie_week()
-                else:
-                    results = self.trending_api.movie_day()
-            elif media_type == 'tv':
-                if time_window == 'week':
-                    results = self.trending_api.tv_week()
-                else:
-                    results = self.trending_api.tv_day()
-            elif media_type == 'all':
-                if time_window == 'week':
-                    results = self.trending_api.all_week()
-                else:
-                    results = self.trending_api.all_day()
-            
-            items = []
-            if hasattr(results, 'results'):
-                items = results.results
-            elif isinstance(results, dict) and 'results' in results:
-                items = results['results']
-            else:
-                items = self._ensure_list(results)
-
-            return [self._parse_basic(item, media_type if media_type != 'all' else None) for item in items]
+            data = await self._get(f"/trending/{media_type}/{time_window}")
+            override = media_type if media_type != 'all' else None
+            return [self._parse_basic(item, override) for item in data.get('results') or []]
         except Exception as e:
-            print(f"Error fetching trending: {e}")
+            logger.error("Error fetching trending: %s", e)
             return []
 
-    def get_details_full(self, media_type: str, tmdb_id: int) -> MediaDetail:
-        append_str = "credits,recommendations,similar"
-        
-        if media_type == 'movie':
-            data = self.movie_api.details(tmdb_id, append_to_response=append_str)
-        else:
-            data = self.tv_api.details(tmdb_id, append_to_response=append_str)
+    async def get_details_full(self, media_type: str, tmdb_id: int, include: Iterable[str] = DETAILS_FULL) -> MediaDetail:
+        """
+        include 为随详情一起请求的附加数据 (append_to_response)，缓存按 include 区分。
+        推荐/相似各带 20 条完整条目，只需要基本信息的调用方应传入更小的集合；
+        若完整详情已在缓存中 (例如订阅前刚打开过详情页)，则直接复用，多出的字段不影响调用方
+        """
+        # 统一为 frozenset 并按位置传参，默认值与显式传入得到相同的缓存 key
+        include = frozenset(include)
+        if include < DETAILS_FULL:
+            full = self._detail_cache.get(hashkey('details', media_type, tmdb_id, DETAILS_FULL))
+            if full is not None:
+                return full
+        return await self._get_details(media_type, tmdb_id, include)
+
+    @_memoized(lambda self: self._detail_cache, 'details')
+    async def _get_details(self, media_type: str, tmdb_id: int, include: frozenset) -> MediaDetail:
+        path = f"/movie/{tmdb_id}" if media_type == 'movie' else f"/tv/{tmdb_id}"
+        data = None
+        if include < DETAILS_FULL:
+            # 进程内缓存未命中时，再看持久化缓存中是否有未过期的完整详情
+            data, overdue = await self._read_cache(
+                self._cache_key('details', path, {'append_to_response': _append_str(DETAILS_FULL)})
+            )
+            if overdue >= 0:
+                data = None
+        if data is None:
+            params = {'append_to_response': _append_str(include)} if include else {}
+            data = await self._get_cached('details', path, ttl=_details_ttl, stale_grace=7 * DAY, **params)
 
         basic = self._parse_basic(data, media_type)
         
         directors, cast = [], []
-        credits_obj = self._get_attr(data, 'credits')
+        credits_obj = data.get('credits')
         if credits_obj:
             directors, cast = self._parse_credits(credits_obj)
 
-        recommendations = []
-        recs_obj = self._get_attr(data, 'recommendations')
-        if recs_obj:
-            recs_list = self._ensure_list(self._get_attr(recs_obj, 'results'))
-            recommendations = [self._parse_basic(i, media_type) for i in recs_list[:10]]
-            
-        similar = []
-        sim_obj = self._get_attr(data, 'similar')
-        if sim_obj:
-            sim_list = self._ensure_list(self._get_attr(sim_obj, 'results'))
-            similar = [self._parse_basic(i, media_type) for i in sim_list[:10]]
+        recs_list = (data.get('recommendations') or {}).get('results') or []
+        recommendations = [self._parse_basic(i, media_type) for i in recs_list[:10]]
+
+        sim_list = (data.get('similar') or {}).get('results') or []
+        similar = [self._parse_basic(i, media_type) for i in sim_list[:10]]
 
         genres = []
-        raw_genres = self._ensure_list(self._get_attr(data, 'genres'))
         genre_ids = []
-        for g in raw_genres:
-            gid = self._get_attr(g, 'id')
-            gname = self._get_attr(g, 'name')
-            genres.append(Genre(id=gid, name=gname))
+        for g in data.get('genres') or []:
+            gid = g.get('id')
+            genres.append(Genre.model_construct(id=gid, name=g.get('name')))
             genre_ids.append(gid)
         
         seasons = []
         if media_type == 'tv':
-            raw_seasons = self._ensure_list(self._get_attr(data, 'seasons'))
-            for s in raw_seasons:
-                seasons.append(Season(
-                    id=self._get_attr(s, 'id', 0),
-                    season_number=self._get_attr(s, 'season_number', 0),
-                    name=self._get_attr(s, 'name', ''),
-                    poster_path=self._get_image_url(self._get_attr(s, 'poster_path')),
-                    episode_count=self._get_attr(s, 'episode_count', 0),
-                    air_date=self._get_attr(s, 'air_date')
+            for s in data.get('seasons') or []:
+                seasons.append(Season.model_construct(
+                    id=s.get('id') or 0,
+                    season_number=s.get('season_number') or 0,
+                    name=s.get('name') or '',
+                    poster_path=(_IMG_W500 + p) if (p := s.get('poster_path')) else None,
+                    episode_count=s.get('episode_count') or 0,
+                    air_date=s.get('air_date')
                 ))
 
         basic.genre_ids = genre_ids 
 
-        return MediaDetail(
-            **basic.dict(),
+        return MediaDetail.model_construct(
+            **basic.__dict__,
             genres=genres,
-            tagline=self._get_attr(data, 'tagline', ''),
-            status=self._get_attr(data, 'status', ''),
+            tagline=data.get('tagline') or '',
+            status=data.get('status') or '',
             directors=directors,
             cast=cast,
             recommendations=recommendations,
@@ -205,23 +389,52 @@ class TMDBService:
             seasons=seasons
         )
 
-    def search_media(self, query: str, page: int = 1) -> SearchResult:
-        results = self.search_api.multi(term=query, page=page)
-        safe_results = self._ensure_list(results)
-        
-        parsed = []
-        for item in safe_results:
-            m_type = self._get_attr(item, 'media_type')
-            if m_type not in ['movie', 'tv']: continue
+    async def get_details_batch(self, media_type: str, tmdb_ids: List[int]) -> List[MediaDetail]:
+        """并发获取多部作品的详情 (受信号量限流)，按输入顺序返回，获取失败的条目会被跳过"""
+        results = await asyncio.gather(
+            *[self.get_details_full(media_type, tmdb_id) for tmdb_id in tmdb_ids],
+            return_exceptions=True
+        )
+        details = []
+        for tmdb_id, res in zip(tmdb_ids, results):
+            if isinstance(res, BaseException):
+                logger.warning("Failed to fetch %s %s: %s", media_type, tmdb_id, res)
+                continue
+            details.append(res)
+        return details
 
-            parsed.append(self._parse_basic(item))
-            
-        return SearchResult(total_results=len(parsed), page=page, results=parsed)
+    @_memoized(lambda self: self._list_cache, 'search')
+    async def search_media(self, query: str, page: int = 1) -> SearchResult:
+        data = await self._get_cached('search', "/search/multi", ttl=HOUR, query=query, page=page)
+        # 多重搜索会包含人物等结果，只保留电影与剧集
+        parsed = [
+            self._parse_basic(item)
+            for item in data.get('results') or []
+            if item.get('media_type') in ('movie', 'tv')
+        ]
+        # 搜索后大概率会点开前几条结果，后台预取其详情
+        self._spawn(self._warm_details(parsed[:SEARCH_WARM_COUNT]), name="tmdb-warm-search")
+        return SearchResult.model_construct(total_results=len(parsed), page=page, results=parsed)
 
-    def discover_media(self, media_type: str, page: int = 1, sort_by: str = "popularity.desc",
+    async def discover_media(self, media_type: str, page: int = 1, sort_by: str = "popularity.desc",
                        with_genres: Optional[str] = None, start_date: Optional[str] = None,
                        end_date: Optional[str] = None, min_vote: float = 0, min_vote_count: int = 0,
-                       with_original_language: Optional[str] = None) -> SearchResult:
+                       with_original_language: Optional[str] = None, prefetch: bool = True) -> SearchResult:
+        # 统一以关键字参数调用，相同的筛选条件总是得到相同的缓存 key
+        filters = dict(
+            sort_by=sort_by, with_genres=with_genres, start_date=start_date, end_date=end_date,
+            min_vote=min_vote, min_vote_count=min_vote_count, with_original_language=with_original_language
+        )
+        result = await self._discover_page(media_type, page, **filters)
+        # 翻页通常是连续的：后台预取下一页 (已缓存时只是一次内存查找)。预热时按页数精确抓取，不预取
+        if prefetch and result.results:
+            self._spawn(self._discover_page(media_type, page + 1, **filters), name="tmdb-prefetch-discover")
+        return result
+
+    @_memoized(lambda self: self._list_cache, 'discover')
+    async def _discover_page(self, media_type: str, page: int, sort_by: str, with_genres: Optional[str],
+                             start_date: Optional[str], end_date: Optional[str], min_vote: float,
+                             min_vote_count: int, with_original_language: Optional[str]) -> SearchResult:
         params = {
             'page': page, 
             'sort_by': sort_by, 
@@ -235,62 +448,62 @@ class TMDBService:
         if media_type == 'movie':
             if start_date: params['primary_release_date.gte'] = start_date
             if end_date: params['primary_release_date.lte'] = end_date
-            results = self.discover_api.discover_movies(params)
+            results = (await self._get_cached('discover', "/discover/movie", ttl=HOUR, **params)).get('results')
         elif media_type == 'tv':
             if start_date: params['first_air_date.gte'] = start_date
             if end_date: params['first_air_date.lte'] = end_date
-            results = self.discover_api.discover_tv_shows(params)
+            results = (await self._get_cached('discover', "/discover/tv", ttl=HOUR, **params)).get('results')
         else:
             results = []
 
-        parsed = [self._parse_basic(item, media_type) for item in self._ensure_list(results)]
-        return SearchResult(total_results=len(parsed), page=page, results=parsed)
+        parsed = [self._parse_basic(item, media_type) for item in results or []]
+        return SearchResult.model_construct(total_results=len(parsed), page=page, results=parsed)
 
-    def get_discovery(self, list_type: str, page: int = 1) -> SearchResult:
+    @_memoized(lambda self: self._list_cache, 'discovery')
+    async def get_discovery(self, list_type: str, page: int = 1) -> SearchResult:
         if list_type == 'movies_playing':
-            res = self.movie_api.now_playing(page=page)
+            res = (await self._get_cached('discovery', "/movie/now_playing", ttl=HOUR, page=page)).get('results')
             m_type = 'movie'
         elif list_type == 'tv_airing':
-            res = self.tv_api.on_the_air(page=page)
+            res = (await self._get_cached('discovery', "/tv/on_the_air", ttl=HOUR, page=page)).get('results')
             m_type = 'tv'
         else:
             res = []
             m_type = 'movie'
 
-        parsed = [self._parse_basic(item, m_type) for item in self._ensure_list(res)]
-        return SearchResult(total_results=len(parsed), page=page, results=parsed)
+        parsed = [self._parse_basic(item, m_type) for item in res or []]
+        return SearchResult.model_construct(total_results=len(parsed), page=page, results=parsed)
 
-    def get_genres(self, media_type: str):
-        if media_type == 'movie':
-            return self._ensure_list(self.genre_api.movie_list())
-        return self._ensure_list(self.genre_api.tv_list())
+    @_memoized(lambda self: self._genre_cache, 'genres')
+    async def get_genres(self, media_type: str) -> List[Dict[str, Any]]:
+        data = await self._get_cached('genres', f"/genre/{media_type}/list", ttl=30 * DAY)
+        return [{'id': g.get('id'), 'name': g.get('name')} for g in data.get('genres') or []]
 
-    def get_season_details(self, tv_id: int, season_number: int) -> Season:
-        s_data = self.season_api.details(tv_id, season_number)
+    @_memoized(lambda self: self._detail_cache, 'season')
+    async def get_season_details(self, tv_id: int, season_number: int) -> Season:
+        s_data = await self._get_cached('season', f"/tv/{tv_id}/season/{season_number}", ttl=DAY)
         
         episodes = []
-        raw_eps = self._ensure_list(self._get_attr(s_data, 'episodes'))
-        
-        for ep in raw_eps:
-            episodes.append(Episode(
-                id=self._get_attr(ep, 'id'),
-                episode_number=self._get_attr(ep, 'episode_number'),
+        for ep in s_data.get('episodes') or []:
+            episodes.append(Episode.model_construct(
+                id=ep.get('id'),
+                episode_number=ep.get('episode_number'),
                 season_number=season_number,
-                name=self._get_attr(ep, 'name'),
-                overview=self._get_attr(ep, 'overview'),
-                still_path=self._get_image_url(self._get_attr(ep, 'still_path'), "original"),
-                air_date=self._get_attr(ep, 'air_date'),
-                vote_average=self._get_attr(ep, 'vote_average', 0.0)
+                name=ep.get('name'),
+                overview=ep.get('overview'),
+                still_path=(_IMG_ORIG + p) if (p := ep.get('still_path')) else None,
+                air_date=ep.get('air_date'),
+                vote_average=ep.get('vote_average') or 0.0
             ))
 
-        return Season(
-            id=self._get_attr(s_data, 'id', 0) or 0,
+        return Season.model_construct(
+            id=s_data.get('id') or 0,
             season_number=season_number,
-            name=self._get_attr(s_data, 'name', f"Season {season_number}"),
-            poster_path=self._get_image_url(self._get_attr(s_data, 'poster_path')),
+            name=s_data.get('name') or f"Season {season_number}",
+            poster_path=(_IMG_W500 + p) if (p := s_data.get('poster_path')) else None,
             episode_count=len(episodes),
-            air_date=self._get_attr(s_data, 'air_date'),
+            air_date=s_data.get('air_date'),
             episodes=episodes
         )
 
-tmdb_service = TMDBService()
\ No newline at end of file
+tmdb_service = TMDBService()
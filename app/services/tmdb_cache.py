@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import threading
+import time
+from hashlib import blake2b
+from typing import Optional, Tuple
+
+DB_FILE = "data/tmdb_cache.db"
+# 过期条目仍保留一段时间，供后台刷新期间或 TMDB 不可用时返回旧数据
+STALE_RETENTION = 30 * 24 * 3600
+
+def make_key(kind: str, *parts) -> str:
+    """(类型, 参数...) -> 定长 key，例如 tmdb:details:3f2a..."""
+    digest = blake2b(repr(parts).encode("utf-8"), digest_size=16).hexdigest()
+    return f"tmdb:{kind}:{digest}"
+
+class TMDBCache:
+    """
+    TMDB 响应的持久化缓存 (SQLite)。
+    进程重启后依然有效，多个 worker 共享同一份数据；payload 为 TMDB 返回的原始 JSON 字节串。
+    """
+    def __init__(self, path: str = DB_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS tmdb_cache (
+                    key TEXT PRIMARY KEY,
+                    payload BLOB NOT NULL,
+                    cached_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("DELETE FROM tmdb_cache WHERE expires_at < ?", (time.time() - STALE_RETENTION,))
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """返回 (payload, expires_at)，包括已过期但仍在保留期内的条目，由调用方判断是否新鲜"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, expires_at FROM tmdb_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, key: str, payload: bytes, ttl: float):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tmdb_cache VALUES (?, ?, ?, ?)",
+                (key, payload, now, now + ttl)
+            )
+
+tmdb_cache = TMDBCache()